@@ -1,8 +1,18 @@
 import re
+import os
+import bisect
+import sys
+import hashlib
+import marshal
 import logging
 import time
+import asyncio
 import requests
 import PyPDF2
+import aio_http
+import http_client
+
+STATION_INDEX_VERSION = 1
 
 def clean_station_name(name):
     """Normalize station names for matching"""
@@ -59,30 +69,147 @@ def extract_station_codes(pdf_path):
         logging.error(f"Error extracting station codes: {e}")
         return {}
 
-def search_station(station_data, query):
-    """Search for a station by name with transliteration support"""
+def _file_sha1(path):
+    h = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 16), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+def _write_station_index(index, index_path):
+    """Write via a tmp file and os.replace so readers never see a half-written index"""
+    tmp_path = index_path + ".tmp"
+    with open(tmp_path, 'wb') as f:
+        marshal.dump(index, f)
+    os.replace(tmp_path, index_path)
+
+def build_station_index(pdf_path, index_path=None):
+    """Parse the station PDF once and persist the codes as a marshal file"""
+    index_path = index_path or pdf_path + ".idx"
+    station_data = extract_station_codes(pdf_path)
+    if not station_data:
+        return station_data
+    st = os.stat(pdf_path)
+    index = {
+        'version': STATION_INDEX_VERSION,
+        'mtime': st.st_mtime,
+        'size': st.st_size,
+        'sha1': _file_sha1(pdf_path),
+        'stations': station_data,
+    }
+    try:
+        _write_station_index(index, index_path)
+        logging.info(f"Wrote station index with {len(station_data)} stations to {index_path}")
+    except OSError as e:
+        logging.warning(f"Could not write station index {index_path}: {e}")
+    return station_data
+
+def load_station_codes(pdf_path, index_path=None):
+    """
+    Load station codes from the persisted index, rebuilding it from the PDF only when
+    the PDF's mtime/size changed and its hash no longer matches.
+    """
+    index_path = index_path or pdf_path + ".idx"
+    try:
+        with open(index_path, 'rb') as f:
+            index = marshal.load(f)
+        st = os.stat(pdf_path)
+        if index.get('version') == STATION_INDEX_VERSION:
+            if index['mtime'] == st.st_mtime and index['size'] == st.st_size:
+                logging.info(f"Loaded {len(index['stations'])} station codes from index {index_path}")
+                return index['stations']
+            if index['size'] == st.st_size and index['sha1'] == _file_sha1(pdf_path):
+                logging.info(f"Station PDF touched but unchanged, reusing index {index_path}")
+                index['mtime'] = st.st_mtime
+                try:
+                    _write_station_index(index, index_path)
+                except OSError:
+                    pass
+                return index['stations']
+        logging.info(f"Station index {index_path} is stale, rebuilding")
+    except (OSError, EOFError, ValueError, TypeError, KeyError) as e:
+        logging.info(f"No usable station index at {index_path} ({e}), building it")
+    return build_station_index(pdf_path, index_path)
+
+def build_search_index(station_data):
+    """
+    Precompute cleaned names once and index them for exact, prefix and substring lookups.
+    Substring lookups go through a trigram -> station postings table.
+    """
+    names = list(station_data.keys())
+    cleaned = [clean_station_name(name) for name in names]
+    exact = {}
+    trigrams = {}
+    for i, clean_name in enumerate(cleaned):
+        exact.setdefault(clean_name, []).append(i)
+        for k in range(len(clean_name) - 2):
+            trigrams.setdefault(clean_name[k:k+3], set()).add(i)
+    return {
+        'names': names,
+        'codes': [station_data[name] for name in names],
+        'cleaned': cleaned,
+        'exact': exact,
+        'sorted': sorted((clean_name, i) for i, clean_name in enumerate(cleaned)),
+        'trigrams': trigrams,
+    }
+
+_search_index_cache = {'data': None, 'size': 0, 'index': None}
+
+def get_search_index(station_data):
+    """Return the search index for station_data, building it on first use"""
+    cache = _search_index_cache
+    if cache['data'] is not station_data or cache['size'] != len(station_data):
+        cache['index'] = build_search_index(station_data)
+        cache['data'] = station_data
+        cache['size'] = len(station_data)
+    return cache['index']
+
+def search_station(station_data, query, limit=10):
+    """Search for a station by name; returns ranked (name, code) candidates"""
     query = clean_station_name(query)
     logging.info(f"Searching station: {query}")
+    if not query:
+        return []
 
     # Try exact match first
     if query in station_data:
         return [(query, station_data[query])]
-        
-        # Try partial matches
-    results = []
-    for name, code in station_data.items():
-        clean_name = clean_station_name(name)
-        if query in clean_name:
-            results.append((name, code))
-        
-    return results
 
-def get_irctc_api_response(source_code, destination_code, journey_date, quota="GN", retries=3):
-    """Directly call IRCTC API to get train schedules with retry logic"""
-    # Prepare API request
-    api_url = "https://www.irctc.co.in/eticketing/protected/mapps1/altAvlEnq/TC"
-    
-    # Prepare headers (from your packet capture)
+    index = get_search_index(station_data)
+    cleaned = index['cleaned']
+
+    # Rank: exact cleaned name, then prefix, then word prefix, then any substring
+    ranked = {}
+    for i in index['exact'].get(query, ()):
+        ranked[i] = 0
+
+    sorted_names = index['sorted']
+    pos = bisect.bisect_left(sorted_names, (query, -1))
+    while pos < len(sorted_names) and sorted_names[pos][0].startswith(query):
+        ranked.setdefault(sorted_names[pos][1], 1)
+        pos += 1
+
+    if len(query) >= 3:
+        postings = [index['trigrams'].get(query[k:k+3]) for k in range(len(query) - 2)]
+        if all(postings):
+            postings.sort(key=len)
+            candidates = set.intersection(*postings)
+        else:
+            candidates = ()
+    else:
+        candidates = range(len(cleaned))
+    for i in candidates:
+        if i in ranked or query not in cleaned[i]:
+            continue
+        ranked[i] = 2 if (' ' + query) in (' ' + cleaned[i]) else 3
+
+    order = sorted(ranked, key=lambda i: (ranked[i], len(cleaned[i]), cleaned[i]))
+    return [(index['names'][i], index['codes'][i]) for i in order[:limit]]
+
+IRCTC_API_URL = "https://www.irctc.co.in/eticketing/protected/mapps1/altAvlEnq/TC"
+
+def _irctc_request(source_code, destination_code, journey_date, quota="GN"):
+    """Headers and JSON payload for the availability enquiry (from a packet capture)"""
     headers = {
         'authority': 'www.irctc.co.in',
         'accept': 'application/json, text/plain, */*',
@@ -100,8 +227,6 @@ def get_irctc_api_response(source_code, destination_code, journey_date, quota="G
         'user-agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/137.0.0.0 Safari/537.36 Edg/137.0.0.0',
         'bmirak': 'webbm'
     }
-    
-    # Prepare payload (from your packet capture)
     payload = {
         "concessionBooking": False,
         "srcStn": source_code,
@@ -116,42 +241,60 @@ def get_irctc_api_response(source_code, destination_code, journey_date, quota="G
         "loyaltyRedemptionBooking": False,
         "ftBooking": False
     }
-    
-    # Create a session
-    session = requests.Session()
-    
+    return headers, payload
+
+def get_irctc_api_response(source_code, destination_code, journey_date, quota="GN", retries=None):
+    """
+    Directly call IRCTC API to get train schedules. retries is the number of attempts, as in
+    the async version; backoff comes from http_client and None keeps the host's retry policy.
+    """
+    headers, payload = _irctc_request(source_code, destination_code, journey_date, quota)
+    # http_client counts retries after the first try
+    retry_count = None if retries is None else max(retries - 1, 0)
+    try:
+        logging.info(f"Sending IRCTC API request: {source_code} -> {destination_code} on {journey_date}")
+        response = http_client.post(IRCTC_API_URL, retries=retry_count, headers=headers, json=payload)
+        logging.info(f"API response status: {response.status_code}")
+        if response.status_code != 200:
+            logging.error(f"API request failed with status {response.status_code}")
+            logging.error(f"Response text: {response.text[:500]}")
+            return None
+        return response.json()
+    except requests.exceptions.Timeout:
+        logging.warning("IRCTC request timed out after retries")
+    except requests.exceptions.ConnectionError as ce:
+        logging.warning(f"Connection error: {str(ce)}")
+    except Exception as e:
+        logging.error(f"API request failed: {str(e)}")
+    return None
+
+async def get_irctc_api_response_async(source_code, destination_code, journey_date, quota="GN", retries=3):
+    """Async get_irctc_api_response on the shared session; backoff waits don't hold a thread"""
+    headers, payload = _irctc_request(source_code, destination_code, journey_date, quota)
+    session = await aio_http.get_session()
+
     for attempt in range(retries):
         try:
             logging.info(f"Sending IRCTC API request (attempt {attempt+1}/{retries})...")
-            logging.info(f"Source: {source_code}, Destination: {destination_code}, Date: {journey_date}")
-            response = session.post(
-                api_url,
-                headers=headers,
-                json=payload,
-                timeout=15  # Increased timeout
-            )
-            
-            logging.info(f"API response status: {response.status_code}")
-            
-            if response.status_code != 200:
-                logging.error(f"API request failed with status {response.status_code}")
-                logging.error(f"Response text: {response.text[:500]}")
+            async with session.post(IRCTC_API_URL, headers=headers, json=payload,
+                                    timeout=aio_http.client_timeout(15)) as response:
+                logging.info(f"API response status: {response.status}")
+                if response.status == 200:
+                    return await response.json(content_type=None)
+                logging.error(f"API request failed with status {response.status}")
+                logging.error(f"Response text: {(await response.text())[:500]}")
                 continue  # Try again
-                
-            return response.json()
-            
-        except requests.exceptions.Timeout:
+        except asyncio.TimeoutError:
             logging.warning(f"Request timeout on attempt {attempt+1}")
-        except requests.exceptions.ConnectionError as ce:
+        except aio_http.aiohttp.ClientConnectionError as ce:
             logging.warning(f"Connection error: {str(ce)}")
         except Exception as e:
             logging.error(f"API request failed: {str(e)}")
-        
-        # Exponential backoff before retrying
+
         sleep_time = 2 ** attempt  # 1, 2, 4 seconds
         logging.info(f"Waiting {sleep_time} seconds before retry...")
-        time.sleep(sleep_time)
-    
+        await asyncio.sleep(sleep_time)
+
     logging.error(f"All {retries} attempts failed")
     return None
 
@@ -194,3 +337,12 @@ def parse_train_schedules(api_response):
     except Exception as e:
         logging.error(f"Error parsing API response: {str(e)}")
         return []
+
+
+if __name__ == "__main__":
+    # Offline build step: python IRCTC.py path/to/Station_code.pdf
+    logging.basicConfig(level=logging.INFO)
+    if len(sys.argv) < 2:
+        print("Usage: python IRCTC.py <Station_code.pdf> [index_path]")
+        sys.exit(1)
+    build_station_index(sys.argv[1], sys.argv[2] if len(sys.argv) > 2 else None)
@@ -1,76 +1,228 @@
-import requests
-import logging
+import os
 import re
-import tempfile
+import sys
+import json
+import time
+import logging
+import threading
+import http_client
+from collections import OrderedDict
 from bs4 import BeautifulSoup
-from selenium import webdriver
+from fuzzywuzzy import process, fuzz
 from selenium.webdriver.common.by import By
-from selenium.webdriver.edge.service import Service as EdgeService
-from selenium.webdriver.edge.options import Options as EdgeOptions
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
-from selenium.common.exceptions import TimeoutException, WebDriverException
-from selenium.webdriver.common.action_chains import ActionChains
-import os
-import time
-from bs4 import BeautifulSoup
-from selenium import webdriver
-from selenium.webdriver.edge.service import Service as EdgeService
-from selenium.webdriver.edge.options import Options as EdgeOptions
 from selenium.common.exceptions import NoSuchElementException, TimeoutException, WebDriverException
+from browser_pool import driver_pool
 
-def get_abhibus_city_id(target_city):
-    """Scrape AbhiBus /routes pages to find city ID corresponding to target_city."""
-    base_url = "https://www.abhibus.com/routes/"
-    letter_offsets = {
-        'A':0,'B':540,'C':1530,'D':1980,'E':2520,'F':2610,'G':2700,'H':3060,'I':3330,'J':3420,
-        'K':3780,'L':5040,'M':5220,'N':6210,'O':6750,'P':6750,'Q':7560,'R':7560,'S':8010,'T':8460
-    }
-    tc = target_city.strip().lower()
-    if not tc:
+# Offline AbhiBus city-ID directory, crawled from /routes and persisted locally. It is built
+# at startup in the background (or offline: python abhibus.py); until it has cities, lookups
+# fall back to walking /routes from the query's first-letter page like before.
+ROUTES_URL = "https://www.abhibus.com/routes/"
+CITY_DIRECTORY_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "abhibus_cities.json")
+PAGE_INCREMENT = 90
+MAX_PAGES = 200                     # safety cap on the /routes pagination
+PAGE_REFRESH_AGE = 7 * 24 * 3600    # re-crawl a page once it is a week old
+FUZZY_THRESHOLD = 88
+LOOKUP_CACHE_SIZE = 1024          # resolved query strings kept, least recently used dropped first
+# First /routes offset for each letter, used by the fallback page walk
+LETTER_OFFSETS = {
+    'A':0,'B':540,'C':1530,'D':1980,'E':2520,'F':2610,'G':2700,'H':3060,'I':3330,'J':3420,
+    'K':3780,'L':5040,'M':5220,'N':6210,'O':6750,'P':6750,'Q':7560,'R':7560,'S':8010,'T':8460
+}
+FALLBACK_MAX_OFFSET = 8460
+
+city_directory = {'pages': {}}      # str(offset) -> {'fetched_at': ts, 'cities': {name: id}}
+city_index = {}                     # lower-case city name -> id, replaced whole on rebuild
+_lookup_cache = OrderedDict()      # query -> id or None, replaced whole on rebuild
+_lookup_lock = threading.Lock()
+_directory_lock = threading.Lock()
+_refresh_thread = None
+
+def fetch_routes_page(offset):
+    """Fetch one /routes page; returns {name: id}, {} for a page without the form, None past the end."""
+    url = f"{ROUTES_URL}{offset}" if offset > 0 else ROUTES_URL
+    resp = http_client.get(url, headers={"User-Agent": "Mozilla/5.0"})
+    resp.raise_for_status()
+    soup = BeautifulSoup(resp.text, 'html.parser')
+    form = soup.find('form', {'id': 'frmRoute'})
+    if not form:
+        return {}
+    city_list = form.select('div.opt-list div.detrow ul li')
+    if not city_list:
         return None
+    cities = {}
+    for li in city_list:
+        link = li.find('a')
+        if not link:
+            continue
+        m = re.search(r'/routes/(\d+)', link.get('href', ''))
+        if m:
+            cities[link.get_text(strip=True).lower()] = m.group(1)
+    return cities
+
+def _rebuild_city_index():
+    """Rebuild city_index from the pages (call with _directory_lock held)"""
+    global city_index, _lookup_cache
+    index = {}
+    for offset in sorted(city_directory['pages'], key=int):
+        for name, city_id in city_directory['pages'][offset]['cities'].items():
+            index.setdefault(name, city_id)
+    # Swap in new dicts so lookups that already hold the old ones aren't changed under them
+    city_index = index
+    _lookup_cache = OrderedDict()
+
+def save_city_directory():
+    tmp_path = CITY_DIRECTORY_PATH + ".tmp"
+    with _directory_lock:
+        data = json.dumps(city_directory)
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(data)
+    os.replace(tmp_path, CITY_DIRECTORY_PATH)
+
+def load_city_directory():
+    """Load the persisted directory; returns True if it had any cities"""
+    global city_directory
+    try:
+        with open(CITY_DIRECTORY_PATH, encoding='utf-8') as f:
+            directory = json.load(f)
+    except (OSError, ValueError) as e:
+        logging.info(f"No AbhiBus city directory at {CITY_DIRECTORY_PATH} ({e})")
+        directory = {'pages': {}}
+    with _directory_lock:
+        city_directory = directory
+        _rebuild_city_index()
+    return bool(city_index)
+
+def crawl_city_directory(only_stale=False):
+    """
+    Walk /routes page by page and store each page's cities. With only_stale=True, pages
+    fetched within PAGE_REFRESH_AGE are skipped so a refresh only re-fetches what is old.
+    """
+    now = time.time()
+    changed = False
+    for page in range(MAX_PAGES):
+        offset = page * PAGE_INCREMENT
+        key = str(offset)
+        with _directory_lock:
+            cached = city_directory['pages'].get(key)
+        if only_stale and cached and now - cached['fetched_at'] < PAGE_REFRESH_AGE:
+            continue
+        try:
+            cities = fetch_routes_page(offset)
+        except Exception as e:
+            logging.error(f"Error crawling AbhiBus routes page {offset}: {e}")
+            break
+        if cities is None:
+            break
+        with _directory_lock:
+            if not cached or cached['cities'] != cities:
+                changed = True
+            city_directory['pages'][key] = {'fetched_at': now, 'cities': cities}
+        time.sleep(0.2)
+    if changed:
+        with _directory_lock:
+            _rebuild_city_index()
+        try:
+            save_city_directory()
+        except OSError as e:
+            logging.warning(f"Could not save AbhiBus city directory: {e}")
+    logging.info(f"AbhiBus city directory has {len(city_index)} cities")
+
+def _has_stale_pages():
+    now = time.time()
+    with _directory_lock:
+        return any(now - p['fetched_at'] >= PAGE_REFRESH_AGE for p in city_directory['pages'].values())
+
+def refresh_city_directory_async(only_stale=True):
+    """Crawl /routes in a background thread (at most one crawl at a time)"""
+    global _refresh_thread
+    with _directory_lock:
+        if _refresh_thread and _refresh_thread.is_alive():
+            return
+        _refresh_thread = threading.Thread(target=crawl_city_directory, kwargs={'only_stale': only_stale},
+                                           name="abhibus-city-refresh", daemon=True)
+        _refresh_thread.start()
+
+def warm_city_directory():
+    """Startup hook: load the saved directory, then build or refresh it in the background"""
+    if not load_city_directory():
+        logging.info("Building AbhiBus city directory in the background")
+        refresh_city_directory_async(only_stale=False)
+    elif _has_stale_pages():
+        refresh_city_directory_async()
+
+def _walk_routes_pages(tc):
+    """The pre-directory lookup: walk /routes from tc's first-letter page to the first name containing tc"""
     first_char = tc[0].upper()
     if not first_char.isalpha():
         return None
-    current_offset = letter_offsets.get(first_char, 0)
-    page_increment = 90
-    max_offset = 8460
-    while current_offset <= max_offset:
-        url = f"{base_url}{current_offset}" if current_offset > 0 else base_url
-        logging.info(f"Looking up AbhiBus city ID for '{tc}' on page {url}")
+    offset = LETTER_OFFSETS.get(first_char, 0)
+    while offset <= FALLBACK_MAX_OFFSET:
+        logging.info(f"Looking up AbhiBus city ID for '{tc}' on /routes page {offset}")
         try:
-            headers = {"User-Agent":"Mozilla/5.0"}
-            resp = requests.get(url, headers=headers, timeout=10)
-            resp.raise_for_status()
-            soup = BeautifulSoup(resp.text, 'html.parser')
-            form = soup.find('form', {'id':'frmRoute'})
-            if not form:
-                current_offset += page_increment
-                continue
-            city_list = form.select('div.opt-list div.detrow ul li')
-            if not city_list:
-                break
-            found = None
-            for li in city_list:
-                link = li.find('a')
-                if not link:
-                    continue
-                link_text = link.get_text(strip=True).lower()
-                if tc in link_text:
-                    href = link.get('href','')
-                    m = re.search(r'/routes/(\d+)', href)
-                    if m:
-                        found = m.group(1)
-                        break
-            if found:
-                return found
-            current_offset += page_increment
-            time.sleep(0.2)
+            cities = fetch_routes_page(offset)
         except Exception as e:
             logging.error(f"Error in get_abhibus_city_id: {e}")
-            break
+            return None
+        if cities is None:
+            return None
+        found = next((city_id for name, city_id in cities.items() if tc in name), None)
+        if found:
+            return found
+        offset += PAGE_INCREMENT
+        time.sleep(0.2)
     return None
 
+def _substring_match(tc):
+    """
+    First city whose name contains tc, scanning the stored pages from tc's first-letter
+    offset onwards as the old page walk did, then the pages before it.
+    """
+    start = LETTER_OFFSETS.get(tc[0].upper(), 0)
+    with _directory_lock:
+        pages = sorted(((int(k), p['cities']) for k, p in city_directory['pages'].items()),
+                       key=lambda page: (page[0] < start, page[0]))
+    for _, cities in pages:
+        for name, city_id in cities.items():
+            if tc in name:
+                return city_id
+    return None
+
+def get_abhibus_city_id(target_city):
+    """Look up the AbhiBus city ID for target_city in the local city directory."""
+    tc = target_city.strip().lower()
+    if not tc:
+        return None
+    if not city_index and _refresh_thread is None:
+        warm_city_directory()   # not started through main.py; load whatever is saved
+    index, lookup_cache = city_index, _lookup_cache
+    if not index:
+        # Directory not built yet: make sure a build is running and use the old page walk meanwhile
+        refresh_city_directory_async(only_stale=False)
+        return _walk_routes_pages(tc)
+    if _has_stale_pages():
+        refresh_city_directory_async()
+
+    with _lookup_lock:
+        if tc in lookup_cache:
+            lookup_cache.move_to_end(tc)
+            return lookup_cache[tc]
+    found = index.get(tc)
+    if not found:
+        found = _substring_match(tc)
+    if not found:
+        match = process.extractOne(tc, list(index), scorer=fuzz.ratio, score_cutoff=FUZZY_THRESHOLD)
+        if match:
+            logging.info(f"AbhiBus: fuzzy matched '{tc}' to '{match[0]}'")
+            found = index[match[0]]
+    with _lookup_lock:
+        lookup_cache[tc] = found
+        lookup_cache.move_to_end(tc)
+        while len(lookup_cache) > LOOKUP_CACHE_SIZE:
+            lookup_cache.popitem(last=False)
+    return found
+
 def scrape_abhibus_results(search_url):
     """Use Selenium to scrape AbhiBus search results from the given search_url.
     
@@ -80,80 +232,55 @@ def scrape_abhibus_results(search_url):
     Returns:
         list: List of dictionaries containing bus service information
     """
-    # Configure Edge options
-    options = EdgeOptions()
-    options.add_argument("--headless=new")
-    options.add_argument("--disable-blink-features=AutomationControlled")
-    options.add_argument("--no-sandbox")  # Crucial for Docker
-    options.add_argument("--disable-dev-shm-usage")  # Prevents /dev/shm issues
-    options.add_argument("--start-maximized")
-    options.add_argument("user-agent=Mozilla/5.0")
-    options.add_experimental_option('excludeSwitches', ['enable-logging'])
-    
-    # Create unique temp directory for browser profile
-    temp_dir = tempfile.mkdtemp()
-    options.add_argument(f"--user-data-dir={temp_dir}")
-    
-    # Initialize WebDriver with error handling
-    driver = None
     results = []
     
     try:
-        # Configure Edge service with logging
-        service = EdgeService(
-            executable_path=r'S:\Project\example\webdriver\msedgedriver.exe',
-            service_args=['--verbose']
-        )
-        
-        driver = webdriver.Edge(service=service, options=options)
-        
-        # Set page load timeout
-        driver.set_page_load_timeout(30)
-        
-        # Navigate to URL
-        driver.get(search_url)
-        
-        # Wait for results to load
-        WebDriverWait(driver, 30).until(
-            EC.presence_of_element_located(
-                (By.CSS_SELECTOR, "div.container.card.service.light.rounded-md")
+        # Borrow a warm browser from the shared pool
+        with driver_pool.driver() as driver:
+            # Navigate to URL
+            driver.get(search_url)
+            
+            # Wait for results to load
+            WebDriverWait(driver, 30).until(
+                EC.presence_of_element_located(
+                    (By.CSS_SELECTOR, "div.container.card.service.light.rounded-md")
+                )
             )
-        )
-        
-        # Extract bus service cards
-        cards = driver.find_elements(
-            By.CSS_SELECTOR, 
-            "div.container.card.service.light.rounded-md"
-        )
-        
-        # Process each card
-        for card in cards:
-            try:
-                results.append({
-                    'provider': 'AbhiBus',
-                    'operator': card.find_element(By.CSS_SELECTOR, "h5.title").text.strip(),
-                    'bus_type': card.find_element(
-                        By.CSS_SELECTOR, "div.operator-info div.sub-title"
-                    ).text.strip(),
-                    'departure': card.find_element(
-                        By.CSS_SELECTOR, "span.departure-time"
-                    ).text.strip(),
-                    'arrival': card.find_element(
-                        By.CSS_SELECTOR, "span.arrival-time"
-                    ).text.strip(),
-                    'duration': card.find_element(
-                        By.CSS_SELECTOR, "div.travel-time"
-                    ).text.strip(),
-                    'fare': card.find_element(
-                        By.CSS_SELECTOR, "span.fare"
-                    ).text.strip(),
-                    'booking_url': search_url
-                })
-            except NoSuchElementException as e:
-                logging.warning(f"Missing element in card: {e}")
-                continue
-                
-        return results
+            
+            # Extract bus service cards
+            cards = driver.find_elements(
+                By.CSS_SELECTOR, 
+                "div.container.card.service.light.rounded-md"
+            )
+            
+            # Process each card
+            for card in cards:
+                try:
+                    results.append({
+                        'provider': 'AbhiBus',
+                        'operator': card.find_element(By.CSS_SELECTOR, "h5.title").text.strip(),
+                        'bus_type': card.find_element(
+                            By.CSS_SELECTOR, "div.operator-info div.sub-title"
+                        ).text.strip(),
+                        'departure': card.find_element(
+                            By.CSS_SELECTOR, "span.departure-time"
+                        ).text.strip(),
+                        'arrival': card.find_element(
+                            By.CSS_SELECTOR, "span.arrival-time"
+                        ).text.strip(),
+                        'duration': card.find_element(
+                            By.CSS_SELECTOR, "div.travel-time"
+                        ).text.strip(),
+                        'fare': card.find_element(
+                            By.CSS_SELECTOR, "span.fare"
+                        ).text.strip(),
+                        'booking_url': search_url
+                    })
+                except NoSuchElementException as e:
+                    logging.warning(f"Missing element in card: {e}")
+                    continue
+                    
+            return results
         
     except TimeoutException:
         logging.error("Timed out waiting for AbhiBus results to load")
@@ -164,20 +291,12 @@ def scrape_abhibus_results(search_url):
     except Exception as e:
         logging.error(f"Unexpected error scraping AbhiBus: {e}")
         return []
-    finally:
-        # Clean up resources
-        try:
-            if driver:
-                driver.quit()
-        except Exception as e:
-            logging.error(f"Error closing driver: {e}")
-        
-        # Clean up temp directory
-        try:
-            if os.path.exists(temp_dir):
-                os.system(f"rm -rf {temp_dir}")
-        except Exception as e:
-            logging.error(f"Error cleaning temp directory: {e}")
 
 def get_abhibus_schedules(search_url):
-    return scrape_abhibus_results(search_url)
\ No newline at end of file
+    return scrape_abhibus_results(search_url)
+
+if __name__ == "__main__":
+    # Offline build step: python abhibus.py [--stale]  (--stale re-crawls only pages older than a week)
+    logging.basicConfig(level=logging.INFO)
+    load_city_directory()
+    crawl_city_directory(only_stale='--stale' in sys.argv[1:])
@@ -0,0 +1,107 @@
+import asyncio
+import atexit
+import logging
+import threading
+from contextlib import asynccontextmanager
+from urllib.parse import urlsplit
+
+try:
+    import aiohttp
+except ImportError:  # async providers are optional; callers fall back to the blocking clients
+    aiohttp = None
+
+# One event loop on a daemon thread owns a shared, connection-pooled aiohttp session.
+# Sync code (Flask views, the provider fan-out) hands coroutines to it, so many HTTP
+# requests can be in flight without a blocked thread per socket.
+TOTAL_CONNECTIONS = 100
+CONNECTIONS_PER_HOST = 10
+DNS_CACHE_TTL = 300
+DEFAULT_TIMEOUT = 15
+USER_AGENT = "transport_finder_v4"
+# Hosts with a usage policy: at most `concurrency` requests in flight and starts spaced
+# at least `min_interval` seconds apart. Nominatim allows about one request a second.
+HOST_LIMITS = {
+    'nominatim.openstreetmap.org': {'concurrency': 1, 'min_interval': 1.0},
+}
+
+_loop = None
+_thread = None
+_session = None
+_lock = threading.Lock()
+_host_gates = {}   # host -> [semaphore, earliest next start (loop time)]; used on the loop only
+
+def available():
+    return aiohttp is not None
+
+def get_loop():
+    """Start the background event loop on first use"""
+    global _loop, _thread
+    with _lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            _thread = threading.Thread(target=_loop.run_forever, name="aio-http", daemon=True)
+            _thread.start()
+    return _loop
+
+async def get_session():
+    """Shared ClientSession; only ever called from coroutines running on our loop"""
+    global _session
+    if _session is None or _session.closed:
+        connector = aiohttp.TCPConnector(limit=TOTAL_CONNECTIONS, limit_per_host=CONNECTIONS_PER_HOST,
+                                         ttl_dns_cache=DNS_CACHE_TTL)
+        # No shared cookie jar: upstream sessions (TNSTC) must not leak between searches
+        _session = aiohttp.ClientSession(connector=connector,
+                                         timeout=aiohttp.ClientTimeout(total=DEFAULT_TIMEOUT),
+                                         cookie_jar=aiohttp.DummyCookieJar(),
+                                         headers={'User-Agent': USER_AGENT})
+    return _session
+
+@asynccontextmanager
+async def host_limit(url):
+    """Hold a request slot for the URL's host per HOST_LIMITS; a no-op for other hosts"""
+    host = urlsplit(url).hostname or ''
+    limit = HOST_LIMITS.get(host)
+    if limit is None:
+        yield
+        return
+    gate = _host_gates.get(host)
+    if gate is None:
+        gate = _host_gates[host] = [asyncio.Semaphore(limit['concurrency']), 0.0]
+    async with gate[0]:
+        loop = asyncio.get_running_loop()
+        delay = gate[1] - loop.time()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        gate[1] = loop.time() + limit['min_interval']
+        yield
+
+def client_timeout(seconds):
+    return aiohttp.ClientTimeout(total=seconds)
+
+async def gather(*aws):
+    return await asyncio.gather(*aws)
+
+def submit(coro):
+    """Schedule a coroutine on the shared loop; returns a concurrent.futures.Future"""
+    return asyncio.run_coroutine_threadsafe(coro, get_loop())
+
+def run(coro, timeout=None):
+    """Block the calling (non-loop) thread until the coroutine finishes"""
+    return submit(coro).result(timeout)
+
+async def _close_session():
+    if _session is not None and not _session.closed:
+        await _session.close()
+
+def shutdown():
+    global _loop
+    if _loop is None:
+        return
+    try:
+        run(_close_session(), timeout=5)
+    except Exception as e:
+        logging.warning(f"Error closing async HTTP session: {e}")
+    _loop.call_soon_threadsafe(_loop.stop)
+    _loop = None
+
+atexit.register(shutdown)
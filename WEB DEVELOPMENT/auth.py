@@ -1,83 +1,92 @@
-import sqlite3
 from werkzeug.security import generate_password_hash, check_password_hash
+from db import transaction, query_one, query_all, execute
+
+HISTORY_PAGE_SIZE = 50
+
+# SQL kept as constants so each connection's statement cache reuses the compiled form
+SQL_USER_BY_USERNAME = "SELECT * FROM users WHERE username = ?"
+SQL_USER_BY_ID = "SELECT * FROM users WHERE id = ?"
+SQL_INSERT_USER = "INSERT INTO users (name, username, password) VALUES (?, ?, ?)"
+SQL_USER_HISTORY = """
+    SELECT id, source, destination, date, mode, searched_at
+    FROM history
+    WHERE user_id = ?
+    ORDER BY searched_at DESC, id DESC
+    LIMIT ? OFFSET ?
+"""
+SQL_HISTORY_ITEM = """
+    SELECT source, destination, date, mode, results, searched_at
+    FROM history
+    WHERE id = ? AND user_id = ?
+"""
+SQL_INSERT_HISTORY = """
+    INSERT INTO history
+    (user_id, source, destination, date, mode, results)
+    VALUES (?, ?, ?, ?, ?, ?)
+"""
 
 def init_db():
-    conn = sqlite3.connect('transport.db')
-    c = conn.cursor()
-    
-    # Create users table if not exists
-    c.execute('''CREATE TABLE IF NOT EXISTS users
-                 (id INTEGER PRIMARY KEY AUTOINCREMENT,
-                  name TEXT NOT NULL,
-                  username TEXT UNIQUE NOT NULL,
-                  password TEXT NOT NULL,
-                  created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)''')
-    
-    # Create history table if not exists
-    c.execute('''CREATE TABLE IF NOT EXISTS history
-                 (id INTEGER PRIMARY KEY AUTOINCREMENT,
-                  user_id INTEGER NOT NULL,
-                  source TEXT NOT NULL,
-                  destination TEXT NOT NULL,
-                  date TEXT NOT NULL,
-                  mode TEXT NOT NULL,
-                  results TEXT,
-                  searched_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                  FOREIGN KEY(user_id) REFERENCES users(id))''')
-    
-    # Check if searched_at column exists, if not add it
-    c.execute("PRAGMA table_info(history)")
-    columns = [column[1] for column in c.fetchall()]
-    if 'searched_at' not in columns:
-        c.execute("ALTER TABLE history ADD COLUMN searched_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP")
-    
-    conn.commit()
-    conn.close()
+    with transaction() as c:
+        # Create users table if not exists
+        c.execute('''CREATE TABLE IF NOT EXISTS users
+                     (id INTEGER PRIMARY KEY AUTOINCREMENT,
+                      name TEXT NOT NULL,
+                      username TEXT UNIQUE NOT NULL,
+                      password TEXT NOT NULL,
+                      created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)''')
+
+        # Create history table if not exists
+        c.execute('''CREATE TABLE IF NOT EXISTS history
+                     (id INTEGER PRIMARY KEY AUTOINCREMENT,
+                      user_id INTEGER NOT NULL,
+                      source TEXT NOT NULL,
+                      destination TEXT NOT NULL,
+                      date TEXT NOT NULL,
+                      mode TEXT NOT NULL,
+                      results TEXT,
+                      searched_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                      FOREIGN KEY(user_id) REFERENCES users(id))''')
+
+        # Check if searched_at column exists, if not add it
+        c.execute("PRAGMA table_info(history)")
+        columns = [column[1] for column in c.fetchall()]
+        if 'searched_at' not in columns:
+            c.execute("ALTER TABLE history ADD COLUMN searched_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP")
+
+        # History pages are always "this user's searches, newest first"; the index carries
+        # the id tie-break too so SQL_USER_HISTORY reads it in order without sorting
+        c.execute("DROP INDEX IF EXISTS idx_history_user_searched")
+        c.execute('''CREATE INDEX IF NOT EXISTS idx_history_user_searched_id
+                     ON history (user_id, searched_at DESC, id DESC)''')
 
 def register_user(name, username, password, confirm_password):
     if password != confirm_password:
         return 'Passwords do not match!'
-    
-    conn = sqlite3.connect('transport.db')
-    c = conn.cursor()
-    
+
     # Check if username exists
-    c.execute("SELECT * FROM users WHERE username = ?", (username,))
-    if c.fetchone():
-        conn.close()
+    if query_one(SQL_USER_BY_USERNAME, (username,)):
         return 'Username already exists!'
-    
+
     # Create new user
     hashed_pw = generate_password_hash(password)
-    c.execute("INSERT INTO users (name, username, password) VALUES (?, ?, ?)", 
-             (name, username, hashed_pw))
-    conn.commit()
-    conn.close()
+    execute(SQL_INSERT_USER, (name, username, hashed_pw))
     return "success"
 
 def login_user(username, password):
-    conn = sqlite3.connect('transport.db')
-    c = conn.cursor()
-    c.execute("SELECT * FROM users WHERE username = ?", (username,))
-    user = c.fetchone()
-    conn.close()
-    
+    user = query_one(SQL_USER_BY_USERNAME, (username,))
     if user and check_password_hash(user[3], password):
         return user
     return None
 
-def get_user_history(user_id):
-    conn = sqlite3.connect('transport.db')
-    c = conn.cursor()
-    c.execute("SELECT * FROM history WHERE user_id = ? ORDER BY created_at DESC", (user_id,))
-    history_items = c.fetchall()
-    conn.close()
-    return history_items
+def get_user_history(user_id, limit=HISTORY_PAGE_SIZE, offset=0):
+    """Rows of (id, source, destination, date, mode, searched_at), newest first"""
+    return query_all(SQL_USER_HISTORY, (user_id, limit, offset))
+
+def get_history_item(history_id, user_id):
+    return query_one(SQL_HISTORY_ITEM, (history_id, user_id))
+
+def add_history(user_id, source, destination, date, mode, results):
+    return execute(SQL_INSERT_HISTORY, (user_id, source, destination, date, mode, results))
 
 def get_user_profile(user_id):
-    conn = sqlite3.connect('transport.db')
-    c = conn.cursor()
-    c.execute("SELECT * FROM users WHERE id = ?", (user_id,))
-    user = c.fetchone()
-    conn.close()
-    return user
\ No newline at end of file
+    return query_one(SQL_USER_BY_ID, (user_id,))
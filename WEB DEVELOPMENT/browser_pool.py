@@ -0,0 +1,125 @@
+import time
+import queue
+import atexit
+import shutil
+import logging
+import tempfile
+import threading
+from contextlib import contextmanager
+from selenium import webdriver
+from selenium.webdriver.edge.service import Service as EdgeService
+from selenium.webdriver.edge.options import Options as EdgeOptions
+from selenium.common.exceptions import TimeoutException, WebDriverException
+
+EDGE_DRIVER_PATH = r'S:\Project\example\webdriver\msedgedriver.exe'
+POOL_SIZE = 3                 # max live Edge processes shared by all searches
+MAX_PAGES_PER_DRIVER = 25     # recycle a browser after this many searches
+CHECKOUT_TIMEOUT = 30         # seconds to wait for a free browser
+PAGE_LOAD_TIMEOUT = 30
+
+def _edge_options(profile_dir):
+    """Edge options shared by the RedBus and AbhiBus scrapers (Docker compatible)"""
+    options = EdgeOptions()
+    options.add_argument("--headless=new")
+    options.add_argument("--disable-gpu")
+    options.add_argument("--no-sandbox")  # Essential for Docker
+    options.add_argument("--disable-dev-shm-usage")  # Prevents /dev/shm issues
+    options.add_argument("--window-size=1920,1080")
+    options.add_argument("--disable-blink-features=AutomationControlled")
+    options.add_experimental_option("excludeSwitches", ["enable-automation", "enable-logging"])
+    options.add_experimental_option("useAutomationExtension", False)
+    options.add_argument("user-agent=Mozilla/5.0")
+    options.add_argument(f"--user-data-dir={profile_dir}")
+    return options
+
+def _launch():
+    """Start a new Edge WebDriver with its own temp profile"""
+    profile_dir = tempfile.mkdtemp(prefix="edge_pool_")
+    try:
+        service = EdgeService(executable_path=EDGE_DRIVER_PATH)
+        driver = webdriver.Edge(service=service, options=_edge_options(profile_dir))
+        driver.set_page_load_timeout(PAGE_LOAD_TIMEOUT)
+        # Mask Selenium detection
+        driver.execute_script("Object.defineProperty(navigator, 'webdriver', {get: () => undefined})")
+    except Exception:
+        shutil.rmtree(profile_dir, ignore_errors=True)
+        raise
+    logging.info(f"Launched pooled Edge browser (profile {profile_dir})")
+    return {'driver': driver, 'profile_dir': profile_dir, 'pages': 0, 'created': time.time()}
+
+def _close(entry):
+    try:
+        entry['driver'].quit()
+    except Exception as e:
+        logging.error(f"Error closing driver: {e}")
+    shutil.rmtree(entry['profile_dir'], ignore_errors=True)
+
+def _healthy(entry):
+    try:
+        return entry['driver'].execute_script("return 1") == 1
+    except Exception:
+        return False
+
+class DriverPool:
+    """Bounded pool of warm Edge WebDrivers shared across requests"""
+
+    def __init__(self, size=POOL_SIZE, max_pages=MAX_PAGES_PER_DRIVER, checkout_timeout=CHECKOUT_TIMEOUT):
+        self.max_pages = max_pages
+        self.checkout_timeout = checkout_timeout
+        self._slots = threading.BoundedSemaphore(size)
+        self._idle = queue.LifoQueue()  # most recently used first, keeps the warmest browser busy
+        self._closed = False
+
+    def checkout(self, timeout=None):
+        timeout = self.checkout_timeout if timeout is None else timeout
+        if not self._slots.acquire(timeout=timeout):
+            raise TimeoutError(f"No browser available within {timeout}s")
+        try:
+            while True:
+                try:
+                    entry = self._idle.get_nowait()
+                except queue.Empty:
+                    return _launch()
+                if _healthy(entry):
+                    return entry
+                logging.warning("Discarding unhealthy pooled browser")
+                _close(entry)
+        except Exception:
+            self._slots.release()
+            raise
+
+    def checkin(self, entry, broken=False):
+        entry['pages'] += 1
+        try:
+            if broken or self._closed or entry['pages'] >= self.max_pages:
+                _close(entry)
+            else:
+                self._idle.put(entry)
+        finally:
+            self._slots.release()
+
+    @contextmanager
+    def driver(self, timeout=None):
+        entry = self.checkout(timeout)
+        broken = False
+        try:
+            yield entry['driver']
+        except TimeoutException:
+            # Slow page, not a dead browser
+            raise
+        except WebDriverException:
+            broken = True
+            raise
+        finally:
+            self.checkin(entry, broken)
+
+    def shutdown(self):
+        self._closed = True
+        while True:
+            try:
+                _close(self._idle.get_nowait())
+            except queue.Empty:
+                break
+
+driver_pool = DriverPool()
+atexit.register(driver_pool.shutdown)
@@ -0,0 +1,124 @@
+import os
+import sys
+import time
+import hashlib
+import marshal
+import logging
+import threading
+import spatial_index
+from stop_matcher import StopMatcher
+
+# OSM bus stop -> MTC stop crosswalk, built offline once both the OSM spatial index
+# and the MTC route list are available:  python crosswalk.py
+# At request time get_matched_bus_stops reads MTC names and coordinates straight
+# from it with a radius lookup, without any string matching.
+CROSSWALK_VERSION = 1
+CROSSWALK_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "mtc_crosswalk.idx")
+CROSSWALK_KIND = 'mtc'
+MIN_CONFIDENCE = 80          # token_set_ratio needed for a node to enter the crosswalk
+# Only OSM nodes in the MTC service area are joined (Chennai metropolitan area)
+MTC_BBOX = (12.6, 79.85, 13.45, 80.4)   # south, west, north, east
+
+_crosswalk = None
+_crosswalk_fingerprint = None
+_lock = threading.Lock()
+
+def stops_fingerprint(all_stops):
+    """Identifies the MTC stop list a crosswalk was built against"""
+    return hashlib.sha1('\n'.join(sorted(all_stops)).encode('utf-8')).hexdigest()
+
+def build_crosswalk(all_stops, osm_index=None, path=CROSSWALK_PATH):
+    """Match every named OSM stop in the MTC area to an MTC stop and persist the result"""
+    osm_index = osm_index or spatial_index.get_index()
+    if osm_index is None:
+        raise RuntimeError("No OSM spatial index; build it first with spatial_index.py")
+    south, west, north, east = MTC_BBOX
+    wanted = set(spatial_index.MTC_STOP_KINDS)
+    matcher = StopMatcher(all_stops)
+
+    names, osm_names, lats, lons, confidence = [], [], [], [], []
+    for n, osm_name in enumerate(osm_index['names']):
+        lat, lon = osm_index['lats'][n], osm_index['lons'][n]
+        if not osm_name or wanted.isdisjoint(osm_index['kinds'][n]):
+            continue
+        if not (south <= lat <= north and west <= lon <= east):
+            continue
+        if "TB HOSPITAL" in osm_name.upper():
+            continue
+        match, score = matcher.match_with_score(osm_name, MIN_CONFIDENCE)
+        if match and "TB HOSPITAL" not in match:
+            names.append(match)
+            osm_names.append(osm_name)
+            lats.append(lat)
+            lons.append(lon)
+            confidence.append(score)
+
+    kinds = (CROSSWALK_KIND,)
+    crosswalk = {
+        'version': CROSSWALK_VERSION,
+        'stops_fingerprint': stops_fingerprint(all_stops),
+        'built_at': time.time(),
+        'cell_deg': spatial_index.CELL_DEG,
+        'names': names, 'osm_names': osm_names, 'lats': lats, 'lons': lons,
+        'confidence': confidence,
+        'kinds': [kinds] * len(names),
+        'cells': {CROSSWALK_KIND: spatial_index.make_grid(zip(lats, lons))},
+    }
+    with open(path, 'wb') as f:
+        marshal.dump(crosswalk, f)
+    logging.info(f"Crosswalk: {len(names)} OSM stops matched to {len(set(names))} MTC stops")
+    return crosswalk
+
+def load_crosswalk(path=CROSSWALK_PATH):
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, 'rb') as f:
+            crosswalk = marshal.load(f)
+    except Exception as e:
+        logging.warning(f"Could not read crosswalk {path}: {e}")
+        return None
+    if crosswalk.get('version') != CROSSWALK_VERSION or crosswalk.get('cell_deg') != spatial_index.CELL_DEG:
+        logging.warning(f"Crosswalk {path} has an old format, rebuild it")
+        return None
+    return crosswalk
+
+def get_crosswalk(all_stops):
+    """The crosswalk for this MTC stop list, or None (missing, or built for other routes)"""
+    global _crosswalk, _crosswalk_fingerprint
+    if not all_stops:
+        return None
+    fingerprint = (id(all_stops), len(all_stops))
+    if _crosswalk_fingerprint != fingerprint:
+        with _lock:
+            if _crosswalk_fingerprint != fingerprint:
+                crosswalk = load_crosswalk()
+                if crosswalk and crosswalk['stops_fingerprint'] != stops_fingerprint(all_stops):
+                    logging.warning("Crosswalk was built for a different MTC stop list, ignoring it")
+                    crosswalk = None
+                _crosswalk, _crosswalk_fingerprint = crosswalk, fingerprint
+    return _crosswalk
+
+def nearest_mtc_stops(crosswalk, lat, lon, radius=500, limit=3):
+    """Up to `limit` distinct MTC stops near (lat, lon): name, OSM coords, distance in meters"""
+    found = []
+    seen = set()
+    for f in spatial_index.nearby(lat, lon, radius, (CROSSWALK_KIND,), index=crosswalk):
+        if f['name'] in seen:
+            continue
+        seen.add(f['name'])
+        found.append({"name": f['name'], "coords": f['coords'], "distance": f['distance']})
+        if len(found) == limit:
+            break
+    return found
+
+
+if __name__ == "__main__":
+    # Offline build step, after spatial_index.py: python crosswalk.py
+    logging.basicConfig(level=logging.INFO)
+    import mtc
+    mtc.load_mtc_routes()
+    if not mtc.all_stops:
+        print("Could not load MTC routes")
+        sys.exit(1)
+    build_crosswalk(mtc.all_stops)
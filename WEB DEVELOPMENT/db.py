@@ -0,0 +1,60 @@
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+# Shared data-access layer: one pooled connection per thread, WAL journaling
+DB_PATH = 'transport.db'
+BUSY_TIMEOUT_MS = 5000
+STATEMENT_CACHE_SIZE = 256   # compiled statements kept per connection
+
+_local = threading.local()
+
+def _connect():
+    conn = sqlite3.connect(DB_PATH, timeout=BUSY_TIMEOUT_MS / 1000,
+                           cached_statements=STATEMENT_CACHE_SIZE)
+    # WAL lets readers run alongside a writer; NORMAL sync is safe with WAL
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute(f"PRAGMA busy_timeout={BUSY_TIMEOUT_MS}")
+    conn.execute("PRAGMA foreign_keys=ON")
+    return conn
+
+def get_connection():
+    """Return this thread's connection, opening it on first use"""
+    conn = getattr(_local, 'conn', None)
+    if conn is None:
+        conn = _connect()
+        _local.conn = conn
+    return conn
+
+def close_connection():
+    conn = getattr(_local, 'conn', None)
+    if conn is not None:
+        conn.close()
+        _local.conn = None
+
+@contextmanager
+def transaction():
+    """Yield a cursor; commit on success, roll back on error"""
+    conn = get_connection()
+    cur = conn.cursor()
+    try:
+        yield cur
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cur.close()
+
+def query_one(sql, params=()):
+    return get_connection().execute(sql, params).fetchone()
+
+def query_all(sql, params=()):
+    return get_connection().execute(sql, params).fetchall()
+
+def execute(sql, params=()):
+    """Run a single write statement and commit; returns lastrowid"""
+    with transaction() as cur:
+        cur.execute(sql, params)
+        return cur.lastrowid
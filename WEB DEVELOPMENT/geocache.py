@@ -0,0 +1,120 @@
+import json
+import time
+import logging
+import sqlite3
+import threading
+from collections import OrderedDict
+from db import query_one, execute
+
+# Two-tier geocode cache: in-process LRU in front of a SQLite table in transport.db
+LRU_SIZE = 4096
+POSITIVE_TTL = 30 * 24 * 3600   # places don't move; keep hits for a month
+NEGATIVE_TTL = 24 * 3600        # retry misses daily in case OSM data improves
+
+_lru = OrderedDict()
+_lock = threading.Lock()
+stats = {'lru_hits': 0, 'db_hits': 0, 'misses': 0, 'negative_hits': 0}
+
+class TransientLookupError(Exception):
+    """Raised by a fetch function when the geocoder was unavailable, so the miss is not cached"""
+
+def init_geocode_cache():
+    execute('''CREATE TABLE IF NOT EXISTS geocode_cache
+               (kind TEXT NOT NULL,
+                query TEXT NOT NULL,
+                result TEXT,
+                expires_at REAL NOT NULL,
+                PRIMARY KEY (kind, query))''')
+
+def _db_get(kind, query):
+    try:
+        return query_one("SELECT result, expires_at FROM geocode_cache WHERE kind = ? AND query = ?",
+                         (kind, query))
+    except sqlite3.Error as e:
+        logging.warning(f"Geocode cache read failed: {e}")
+        return None
+
+def _db_put(kind, query, result, expires_at):
+    try:
+        execute("INSERT OR REPLACE INTO geocode_cache (kind, query, result, expires_at) VALUES (?, ?, ?, ?)",
+                (kind, query, json.dumps(result) if result is not None else None, expires_at))
+    except sqlite3.Error as e:
+        logging.warning(f"Geocode cache write failed: {e}")
+
+def _lru_put(key, value, expires_at):
+    with _lock:
+        _lru[key] = (value, expires_at)
+        _lru.move_to_end(key)
+        while len(_lru) > LRU_SIZE:
+            _lru.popitem(last=False)
+
+def _cached(key, now):
+    """(True, value) for a live LRU or SQLite entry, else (False, None)"""
+    with _lock:
+        entry = _lru.get(key)
+        if entry and entry[1] > now:
+            _lru.move_to_end(key)
+            stats['lru_hits'] += 1
+            if entry[0] is None:
+                stats['negative_hits'] += 1
+            return True, entry[0]
+
+    row = _db_get(*key)
+    if row and row[1] > now:
+        value = json.loads(row[0]) if row[0] is not None else None
+        if isinstance(value, list):
+            value = tuple(value)
+        stats['db_hits'] += 1
+        if value is None:
+            stats['negative_hits'] += 1
+        _lru_put(key, value, row[1])
+        return True, value
+
+    stats['misses'] += 1
+    return False, None
+
+def _remember(key, value, now):
+    expires_at = now + (POSITIVE_TTL if value is not None else NEGATIVE_TTL)
+    _lru_put(key, value, expires_at)
+    _db_put(key[0], key[1], value, expires_at)
+
+def cached_lookup(kind, query, fetch):
+    """
+    Return the cached result for (kind, query), calling fetch() on a miss.
+    A None result is cached for NEGATIVE_TTL; TransientLookupError is never cached.
+    """
+    key = (kind, query)
+    now = time.time()
+    hit, value = _cached(key, now)
+    if hit:
+        return value
+
+    try:
+        value = fetch()
+    except TransientLookupError as e:
+        logging.warning(f"Geocoder unavailable for {kind} '{query}', not caching: {e}")
+        return None
+
+    _remember(key, value, now)
+    return value
+
+async def cached_lookup_async(kind, query, fetch):
+    """cached_lookup for a coroutine function fetch"""
+    key = (kind, query)
+    now = time.time()
+    hit, value = _cached(key, now)
+    if hit:
+        return value
+
+    try:
+        value = await fetch()
+    except TransientLookupError as e:
+        logging.warning(f"Geocoder unavailable for {kind} '{query}', not caching: {e}")
+        return None
+
+    _remember(key, value, now)
+    return value
+
+def get_cache_stats():
+    with _lock:
+        return dict(stats, lru_size=len(_lru))
@@ -0,0 +1,40 @@
+import ast
+import json
+import zlib
+import logging
+
+# Search results are stored in history.results as zlib-compressed, column-oriented JSON.
+# Rendered HTML (route_details) is never stored; it is rebuilt from route_steps on view.
+FORMAT_VERSION = 1
+STORED_FIELDS = ('provider', 'operator', 'departure', 'arrival', 'duration', 'fare',
+                 'total_cost', 'booking_link', 'route_steps')
+
+def encode_results(results):
+    """Pack result rows into a compact BLOB for the history table"""
+    payload = {
+        'v': FORMAT_VERSION,
+        'fields': STORED_FIELDS,
+        'rows': [[r.get(field) for field in STORED_FIELDS] for r in results],
+    }
+    data = json.dumps(payload, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+    return zlib.compress(data, 9)
+
+def decode_results(stored):
+    """
+    Unpack history.results into a list of dicts. Handles the compressed format as well as
+    older rows saved as JSON or as str(list) (parsed with ast.literal_eval, never eval).
+    """
+    if not stored:
+        return []
+    try:
+        if isinstance(stored, (bytes, memoryview)):
+            payload = json.loads(zlib.decompress(bytes(stored)).decode('utf-8'))
+            fields = payload['fields']
+            return [dict(zip(fields, row)) for row in payload['rows']]
+        try:
+            return json.loads(stored)
+        except ValueError:
+            return ast.literal_eval(stored)
+    except Exception as e:
+        logging.warning(f"Could not decode stored history results: {e}")
+        return []
@@ -0,0 +1,90 @@
+import logging
+import threading
+from http.cookiejar import DefaultCookiePolicy
+from urllib.parse import urlsplit
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# Shared keep-alive sessions, one per upstream host, so repeat calls reuse pooled
+# TCP/TLS connections instead of handshaking every time. Timeouts and retries are
+# set per host here rather than at each call site.
+DEFAULT_POLICY = {
+    'timeout': 10,          # seconds, used when the caller passes none
+    'retries': 2,
+    'backoff': 0.5,         # urllib3 backoff_factor: 0.5, 1, 2 ... seconds between tries
+    'retry_post': False,    # POSTs are only retried where the endpoint is a read-only query
+    'pool_maxsize': 10,     # connections kept alive to the host
+}
+HOST_POLICIES = {
+    'www.irctc.co.in': {'timeout': 15, 'retries': 3, 'backoff': 1, 'retry_post': True},
+    'www.tnstc.in': {'timeout': 10, 'retry_post': True},
+    'overpass-api.de': {'timeout': 15, 'retry_post': True, 'pool_maxsize': 4},
+    'router.project-osrm.org': {'timeout': 10},
+    'www.abhibus.com': {'timeout': 10, 'pool_maxsize': 4},
+    'mtcbus.tn.gov.in': {'timeout': 15, 'retries': 0},   # get_bus_fares retries incomplete pages itself
+    'greenmesg.org': {'timeout': 5},
+}
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+_sessions = {}
+_lock = threading.Lock()
+
+class _TimeoutSession(requests.Session):
+    """Session that applies the host's default timeout when a call doesn't set one"""
+    def __init__(self, timeout):
+        super().__init__()
+        self.default_timeout = timeout
+
+    def request(self, method, url, **kwargs):
+        kwargs.setdefault('timeout', self.default_timeout)
+        return super().request(method, url, **kwargs)
+
+def host_policy(host):
+    return dict(DEFAULT_POLICY, **HOST_POLICIES.get(host, {}))
+
+def _build_session(host, retries=None):
+    policy = host_policy(host)
+    if retries is not None:
+        policy['retries'] = retries
+    methods = Retry.DEFAULT_ALLOWED_METHODS | ({'POST'} if policy['retry_post'] else set())
+    retry = Retry(total=policy['retries'], connect=policy['retries'], read=policy['retries'],
+                  status=policy['retries'], backoff_factor=policy['backoff'],
+                  status_forcelist=RETRY_STATUSES, allowed_methods=methods,
+                  raise_on_status=False, respect_retry_after_header=True)
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=policy['pool_maxsize'], max_retries=retry)
+    session = _TimeoutSession(policy['timeout'])
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    # Sessions are shared between searches and threads, so never keep server cookies
+    # on them; callers that need a cookie (TNSTC) pass it per request.
+    session.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+    return session
+
+def get_session(url, retries=None):
+    """
+    Shared session for the URL's host, created on first use. retries overrides the host's
+    retry count; each distinct override gets its own pooled session.
+    """
+    host = urlsplit(url).hostname or ''
+    key = (host, retries)
+    session = _sessions.get(key)
+    if session is None:
+        with _lock:
+            session = _sessions.get(key)
+            if session is None:
+                logging.info(f"Opening pooled HTTP session for {host}")
+                session = _sessions[key] = _build_session(host, retries)
+    return session
+
+def get(url, retries=None, **kwargs):
+    return get_session(url, retries).get(url, **kwargs)
+
+def post(url, retries=None, **kwargs):
+    return get_session(url, retries).post(url, **kwargs)
+
+def close_all():
+    with _lock:
+        for session in _sessions.values():
+            session.close()
+        _sessions.clear()
@@ -1,55 +1,245 @@
+import os
 import re
+import sys
 import math
 import time
+import marshal
+import logging
+import threading
+from array import array
+from collections import OrderedDict, namedtuple
 from geopy.distance import geodesic
 from bs4 import BeautifulSoup
-from fuzzywuzzy import process, fuzz
 from geopy.exc import GeocoderTimedOut
 from geopy.geocoders import Nominatim
-import requests
-from utils import haversine_distance, normalize_stop_name, get_min_max_fare, replace_bus_terminal_names, get_transport_icon
+import http_client
+from utils import rank_by_distance, normalize_stop_name, get_min_max_fare, replace_bus_terminal_names, get_transport_icon
 from geopy.geocoders import Nominatim
 import overpy
+import spatial_index
+from stop_matcher import get_matcher
+from crosswalk import get_crosswalk, nearest_mtc_stops
 
 # Initialize geocoder
 geolocator = Nominatim(user_agent="mtc_bus_finder")
 
 # MTC route data and cache
-routes = {}
-stop_routes = {}
-all_stops = set()
+ROUTES_URL = "https://greenmesg.org/dictionary/routes/chennai_bus_routes.txt?161011"
+# Parsed routes are kept in a marshal snapshot so boot doesn't wait on greenmesg.org;
+# the text file is re-checked in the background with a conditional GET.
+ROUTES_SNAPSHOT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "mtc_routes.snapshot")
+ROUTES_SNAPSHOT_VERSION = 2
+ROUTES_REFRESH_AGE = 24 * 3600   # re-check the source once the snapshot is a day old
+routes_meta = {}                 # snapshot bookkeeping: fetched_at, etag, last_modified
+# Route network, interned: stops and routes are small ints, each route is an array('I')
+# of stop ids, and stop -> (route, position) postings are stored CSR-style. All of it
+# lives in one RouteNetwork that is never modified; a refresh rebinds `network` in a
+# single assignment and every query takes one reference to it up front, so ids from
+# one network are never used against another network's arrays.
+RouteNetwork = namedtuple('RouteNetwork', [
+    'stop_names',         # stop id -> normalized stop name
+    'stop_ids',           # normalized stop name -> stop id
+    'route_names',        # route id -> route number; ids follow file order ("first route wins" ties)
+    'route_ids',          # route number -> route id
+    'route_stops',        # route id -> array('I') of stop ids
+    'posting_offsets',    # postings of stop s: [posting_offsets[s], posting_offsets[s+1])
+    'posting_routes',     # route id of each posting
+    'posting_positions',  # position of the stop on that route
+    'max_route_len',
+])
+network = RouteNetwork([], {}, [], {}, [], array('I', [0]), array('I'), array('I'), 0)
+all_stops = network.stop_ids   # membership/iteration over stop names (stop_matcher, crosswalk)
 FARE_CACHE = None
 stop_coords_cache = {}
+_routes_refresh_thread = None
+
+def parse_routes_text(text):
+    """route number -> list of normalized stops, in file order"""
+    parsed = {}
+    for line in text.splitlines():
+        line = line.strip()
+        if not line or ':' not in line:
+            continue
+        rno, stops_str = line.split(':', 1)
+        parsed[rno.strip().upper()] = [normalize_stop_name(s.strip()) for s in stops_str.split(',') if s.strip()]
+    return parsed
+
+def intern_routes(new_routes):
+    """(stop_names, route_names, route_stops) for a {route: [stop names]} dict"""
+    names, ids = [], {}
+    encoded = []
+    for stops in new_routes.values():
+        arr = array('I')
+        for stop in stops:
+            sid = ids.get(stop)
+            if sid is None:
+                sid = ids[stop] = len(names)
+                names.append(stop)
+            arr.append(sid)
+        encoded.append(arr)
+    return names, list(new_routes), encoded
+
+def export_routes(net=None):
+    """The installed network as {route: [stop names]}, e.g. to compare with a fresh download"""
+    net = network if net is None else net
+    return {route: [net.stop_names[s] for s in net.route_stops[r]] for r, route in enumerate(net.route_names)}
+
+def install_routes(new_routes):
+    """Intern and swap in a new {route: [stop names]} set"""
+    install_network(*intern_routes(new_routes))
+
+def build_network(new_stop_names, new_route_names, new_route_stops):
+    """RouteNetwork with the CSR postings for interned stops and routes"""
+    n_stops = len(new_stop_names)
+    counts = [0] * (n_stops + 1)
+    for arr in new_route_stops:
+        for sid in arr:
+            counts[sid + 1] += 1
+    for i in range(n_stops):
+        counts[i + 1] += counts[i]
+    offsets = array('I', counts)
+    total = counts[n_stops]
+    p_routes = array('I', bytes(4 * total))
+    p_positions = array('I', bytes(4 * total))
+    cursor = counts[:n_stops]
+    # Routes in id order, positions in order: each stop's postings come out sorted
+    for rid, arr in enumerate(new_route_stops):
+        for pos, sid in enumerate(arr):
+            c = cursor[sid]
+            p_routes[c] = rid
+            p_positions[c] = pos
+            cursor[sid] = c + 1
+
+    return RouteNetwork(
+        new_stop_names, {name: sid for sid, name in enumerate(new_stop_names)},
+        new_route_names, {route: rid for rid, route in enumerate(new_route_names)}, new_route_stops,
+        offsets, p_routes, p_positions, max((len(arr) for arr in new_route_stops), default=0))
+
+def install_network(new_stop_names, new_route_names, new_route_stops):
+    """Build the new network and swap it in with one assignment"""
+    global network, all_stops
+    new_network = build_network(new_stop_names, new_route_names, new_route_stops)
+    network = new_network
+    all_stops = new_network.stop_ids
+    clear_route_cache()   # cached options refer to the old routes
+
+def save_routes_snapshot(path=ROUTES_SNAPSHOT_PATH):
+    net = network
+    snapshot = {
+        'version': ROUTES_SNAPSHOT_VERSION,
+        'meta': routes_meta,
+        'stop_names': net.stop_names,
+        'route_names': net.route_names,
+        'route_stops': [arr.tobytes() for arr in net.route_stops],
+    }
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'wb') as f:
+        marshal.dump(snapshot, f)
+    os.replace(tmp_path, path)
+
+def load_routes_snapshot(path=ROUTES_SNAPSHOT_PATH):
+    """Install routes from the snapshot; returns True if one was loaded"""
+    global routes_meta
+    try:
+        with open(path, 'rb') as f:
+            snapshot = marshal.load(f)
+    except (OSError, EOFError, ValueError, TypeError) as e:
+        logging.info(f"No MTC route snapshot at {path} ({e})")
+        return False
+    if snapshot.get('version') != ROUTES_SNAPSHOT_VERSION:
+        logging.info("MTC route snapshot has an old format, ignoring it")
+        return False
+    routes_meta = snapshot['meta']
+    encoded = []
+    for raw in snapshot['route_stops']:
+        arr = array('I')
+        arr.frombytes(raw)
+        encoded.append(arr)
+    install_network(snapshot['stop_names'], snapshot['route_names'], encoded)
+    logging.info(f"Loaded {len(network.route_names)} MTC routes from snapshot")
+    return True
+
+def fetch_mtc_routes(conditional=True):
+    """
+    Download the route file (If-None-Match / If-Modified-Since when we have a copy).
+    Returns True if the routes changed; a 304 only refreshes the snapshot's fetch time.
+    """
+    global routes_meta
+    headers = {}
+    if conditional and network.route_names:
+        if routes_meta.get('etag'):
+            headers['If-None-Match'] = routes_meta['etag']
+        if routes_meta.get('last_modified'):
+            headers['If-Modified-Since'] = routes_meta['last_modified']
+    resp = http_client.get(ROUTES_URL, headers=headers)
+    meta = {
+        'fetched_at': time.time(),
+        'etag': resp.headers.get('ETag') or routes_meta.get('etag'),
+        'last_modified': resp.headers.get('Last-Modified') or routes_meta.get('last_modified'),
+    }
+    if resp.status_code == 304:
+        routes_meta = meta
+        save_routes_snapshot()
+        logging.info("MTC routes unchanged (304)")
+        return False
+    resp.raise_for_status()
+    new_routes = parse_routes_text(resp.text)
+    if not new_routes:
+        raise ValueError("route file had no routes")
+    changed = new_routes != export_routes()
+    if changed:
+        install_routes(new_routes)
+        logging.info(f"Installed {len(network.route_names)} MTC routes from {ROUTES_URL}")
+    routes_meta = meta
+    save_routes_snapshot()
+    return changed
+
+def _refresh_routes():
+    try:
+        fetch_mtc_routes()
+    except Exception as e:
+        logging.warning(f"Background MTC route refresh failed: {e}")
+
+def refresh_mtc_routes_async():
+    """Conditional re-fetch in a background thread (at most one at a time)"""
+    global _routes_refresh_thread
+    if _routes_refresh_thread and _routes_refresh_thread.is_alive():
+        return
+    _routes_refresh_thread = threading.Thread(target=_refresh_routes, name="mtc-route-refresh", daemon=True)
+    _routes_refresh_thread.start()
 
 def load_mtc_routes():
-    global routes, stop_routes, all_stops
+    """
+    Warm-start from the snapshot and re-check the source in the background once it is
+    old. Only the very first boot (no snapshot yet) downloads in the foreground.
+    """
+    if load_routes_snapshot():
+        if time.time() - routes_meta.get('fetched_at', 0) >= ROUTES_REFRESH_AGE:
+            refresh_mtc_routes_async()
+        return
     print("Fetching bus routes...")
-    URL = "https://greenmesg.org/dictionary/routes/chennai_bus_routes.txt?161011"
     try:
-        resp = requests.get(URL, timeout=5)
-        resp.raise_for_status()
-        for line in resp.text.splitlines():
-            line = line.strip()
-            if not line or ':' not in line:
-                continue
-            rno, stops_str = line.split(':', 1)
-            stops = [normalize_stop_name(s.strip()) for s in stops_str.split(',') if s.strip()]
-            routes[rno.strip().upper()] = stops
-            all_stops.update(stops)
-        
-        # Precompute stop_routes
-        for route, stops in routes.items():
-            for stop in stops:
-                if stop not in stop_routes:
-                    stop_routes[stop] = set()
-                stop_routes[stop].add(route)
-                
+        fetch_mtc_routes(conditional=False)
     except Exception as e:
+        # No snapshot and no network: keep serving without MTC legs, retry in the background
         print(f"Error fetching bus routes: {str(e)}")
-        raise
-
-def routes_serving(stop):
-    return list(stop_routes.get(normalize_stop_name(stop), set()))
+        refresh_mtc_routes_async()
+
+def route_segment(route, i, j, net=None):
+    """Stop names ridden on route from position i to position j (in travel order)"""
+    net = network if net is None else net
+    stops = net.route_stops[net.route_ids[route]]
+    ids = stops[i:j+1] if i < j else reversed(stops[j:i+1])
+    return [net.stop_names[s] for s in ids]
+
+def routes_serving(stop, net=None):
+    """Route numbers calling at stop, in file order"""
+    net = network if net is None else net
+    sid = net.stop_ids.get(normalize_stop_name(stop))
+    if sid is None:
+        return []
+    served = dict.fromkeys(net.posting_routes[net.posting_offsets[sid]:net.posting_offsets[sid + 1]])
+    return [net.route_names[r] for r in served]
 
 def get_bus_fares():
     """Get bus fares with retry logic and fallback"""
@@ -57,7 +247,6 @@ def get_bus_fares():
     if FARE_CACHE:
         return FARE_CACHE
 
-    import requests
     from bs4 import BeautifulSoup
     import time
 
@@ -100,7 +289,7 @@ def get_bus_fares():
     for attempt in range(3):
         try:
             print(f"Fetching fare information (Attempt {attempt+1})...")
-            response = requests.get(base_url, headers=headers, verify=False, timeout=15)
+            response = http_client.get(base_url, headers=headers, verify=False)
             response.raise_for_status()
             soup = BeautifulSoup(response.content, 'html.parser')
             ordinary_fares = scrape_tab(soup, "tab0")
@@ -138,8 +327,123 @@ def get_fare(stages, fare_dict, max_stage):
         return fare_dict[max_stage]
     return fare_dict.get(stages, fare_dict[max(fare_dict.keys())])
 
+MAX_TRANSFERS = 3
+
+def plan_journeys(start_stop, end_stop, fares=None, max_transfers=MAX_TRANSFERS, net=None):
+    """
+    Round-based (RAPTOR-style) search over route_stops and the CSR postings. Round k finds
+    the cheapest ordinary fare to every stop using k bus rides, so journeys that are
+    Pareto-optimal on (fare, transfers) fall out round by round. Routes run in both directions.
+    Returns a list of journeys (fewest transfers first), each a list of legs
+    {'route', 'from_pos', 'to_pos'} plus the fare totals. Positions refer to net (by default
+    the network installed when the call started); pass the same net to route_segment.
+    """
+    net = network if net is None else net
+    start, end = net.stop_ids.get(start_stop), net.stop_ids.get(end_stop)
+    if start is None or end is None:
+        return []
+    network_stops, offsets, p_routes, p_positions = net.route_stops, net.posting_offsets, net.posting_routes, net.posting_positions
+    ordinary_fares, express_fares = fares or get_bus_fares()
+    max_ordinary_stage = max(ordinary_fares.keys()) if ordinary_fares else 0
+    max_express_stage = max(express_fares.keys()) if express_fares else 0
+    fare_for = [get_fare(stages, ordinary_fares, max_ordinary_stage) for stages in range(net.max_route_len + 1)]
+    inf = float('inf')
+
+    best = {start: 0}                 # cheapest fare to each stop id over all rounds so far
+    labels = [{start: 0}]             # labels[k][stop]: fare improved in round k
+    parents = [{}]                    # parents[k][stop]: (prev stop, route id, from_pos, to_pos)
+    marked = {start}
+    journeys = []
+
+    for k in range(1, max_transfers + 2):
+        prev = labels[k - 1]
+        target_best = best.get(end, inf)
+        # Collect boarding positions per route from stops improved in the previous round
+        boardings = {}
+        for p in marked:
+            base = prev[p]
+            if base + fare_for[1] >= target_best:
+                continue
+            for i in range(offsets[p], offsets[p + 1]):
+                boardings.setdefault(p_routes[i], {})[p_positions[i]] = (base, p)
+
+        current, parent, new_marked = {}, {}, set()
+        # Route ids follow file order, so ties resolve the same way on every run
+        for route in sorted(boardings):
+            boards = boardings[route]
+            stops = network_stops[route]
+            n = len(stops)
+            first, last = min(boards), max(boards)
+            # Forward from the first boarding, backward from the last one
+            for order in (range(first, n), range(last, -1, -1)):
+                # Boardings still worth riding from: a later boarding with a lower or equal
+                # fare dominates every earlier one, since fares never drop with distance
+                active = []
+                for pos_q in order:
+                    if active:
+                        if len(active) == 1:
+                            base, pos_b, p = active[0]
+                            cost = base + fare_for[abs(pos_q - pos_b)]
+                        else:
+                            cost, pos_b, p = min((base + fare_for[abs(pos_q - pos_b)], pos_b, p)
+                                                 for base, pos_b, p in active)
+                        if cost < target_best:
+                            q = stops[pos_q]
+                            if cost < best.get(q, inf):
+                                best[q] = cost
+                                current[q] = cost
+                                parent[q] = (p, route, pos_b, pos_q)
+                                new_marked.add(q)
+                                if q == end:
+                                    target_best = cost
+                    if pos_q in boards:
+                        base, p = boards[pos_q]
+                        active = [a for a in active if a[0] < base]
+                        active.append((base, pos_q, p))
+
+        labels.append(current)
+        parents.append(parent)
+        if end in current:
+            legs = []
+            stop = end
+            for r in range(k, 0, -1):
+                p, route, pos_p, pos_q = parents[r][stop]
+                legs.append({'route': net.route_names[route], 'from_pos': pos_p, 'to_pos': pos_q})
+                stop = p
+            legs.reverse()
+            stages = [abs(leg['to_pos'] - leg['from_pos']) for leg in legs]
+            journeys.append({
+                'legs': legs,
+                'transfers': k - 1,
+                'min_fare': sum(fare_for[st] for st in stages),
+                'max_fare': sum(get_fare(st, express_fares, max_express_stage) for st in stages),
+            })
+        # Only stops improved this round can lead to better journeys next round
+        marked = new_marked - {end}
+        if not marked:
+            break
+    return journeys
+
+def describe_mtc_option(option):
+    """Human readable description of an MTC option (direct, one transfer or more)"""
+    if option['type'] == 'direct':
+        return f"MTC Bus {option['route']} to {option['end']['name']}"
+    legs = option['legs']
+    text = f"MTC Bus {legs[0]['route']} to {legs[0]['path'][-1]}"
+    for leg in legs[1:-1]:
+        text += f", then Bus {leg['route']} to {leg['path'][-1]}"
+    return text + f", then Bus {legs[-1]['route']} to {option['end']['name']}"
+
 def get_nearby_bus_stops(lat, lon, radius=500):
-    """Find nearby bus stops using Overpass API"""
+    """Find nearby bus stops from the local OSM index, or the Overpass API if none is built"""
+    if spatial_index.get_index() is not None:
+        stops = []
+        for f in spatial_index.nearby(lat, lon, radius, spatial_index.MTC_STOP_KINDS):
+            name = (f['name'] or f"Bus stop at {f['coords'][0]},{f['coords'][1]}").upper()
+            if "TB HOSPITAL" not in name:
+                stops.append({"name": name, "coords": f['coords']})
+        return stops
+
     api = overpy.Overpass()
     query = f"""
     [out:json];
@@ -166,32 +470,41 @@ def get_nearby_bus_stops(lat, lon, radius=500):
         return []
 
 def match_stop_name(osm_stop, all_stops, threshold=80):
-    """Find the best matching stop name using fuzzy matching"""
-    osm_normalized = normalize_stop_name(osm_stop)
-    match, score = process.extractOne(osm_normalized, all_stops, scorer=fuzz.token_set_ratio)
-    if score >= threshold:
-        return match
-    return None
+    """Find the best matching stop name using fuzzy matching (indexed and memoised in stop_matcher)"""
+    return get_matcher(all_stops).match(osm_stop, threshold)
 
 def get_matched_bus_stops(lat, lon, all_stops, radius=500):
     """Get matched bus stops from OSM to the MTC stop list"""
+    crosswalk = get_crosswalk(all_stops)
+    if crosswalk is not None:
+        return nearest_mtc_stops(crosswalk, lat, lon, radius)
+
     osm_stops = get_nearby_bus_stops(lat, lon, radius)
     matched_stops = []
     for osm_stop in osm_stops:
         match = match_stop_name(osm_stop["name"], all_stops)
         if match and "TB HOSPITAL" not in match:
-            distance = haversine_distance(lat, lon, osm_stop["coords"][0], osm_stop["coords"][1])
             matched_stops.append({
                 "name": match,
-                "coords": osm_stop["coords"],
-                "distance": distance
+                "coords": osm_stop["coords"]
             })
-    return sorted(matched_stops, key=lambda x: x["distance"])[:3]
+    # One batch distance computation for all matches, keep the three nearest
+    order, distances = rank_by_distance((lat, lon), [s["coords"] for s in matched_stops], limit=3)
+    nearest = []
+    for i in order:
+        matched_stops[i]["distance"] = distances[i]
+        nearest.append(matched_stops[i])
+    return nearest
 
 def get_stop_coordinates(stop_name):
     """Get coordinates for a specific bus stop with caching"""
     if stop_name in stop_coords_cache:
         return stop_coords_cache[stop_name]
+
+    coords = spatial_index.find_by_name(stop_name, ('bus_stop',))
+    if coords:
+        stop_coords_cache[stop_name] = coords
+        return coords
     
     try:
         api = overpy.Overpass()
@@ -220,23 +533,96 @@ def get_stop_coordinates(stop_name):
     
     return None
 
-# Global cache for MTC routes
-mtc_route_cache = {}
+# MTC route options per resolved (start stop, end stop) pair, shared by every search.
+# Bounded LRU with approximate size accounting; cleared when the route network changes.
+ROUTE_CACHE_MAX_BYTES = 16 * 1024 * 1024
+ROUTE_CACHE_MAX_ENTRIES = 5000
+mtc_route_cache = OrderedDict()    # (start_stop, end_stop) -> (options, approx bytes)
+_route_cache_lock = threading.Lock()
+route_cache_stats = {'hits': 0, 'misses': 0, 'evictions': 0, 'bytes': 0}
+
+def _approx_size(obj):
+    """Rough deep size in bytes of the dict/list/str structures an options list is made of"""
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(_approx_size(k) + _approx_size(v) for k, v in obj.items())
+    elif isinstance(obj, (list, tuple)):
+        size += sum(_approx_size(v) for v in obj)
+    return size
+
+def clear_route_cache():
+    with _route_cache_lock:
+        mtc_route_cache.clear()
+        route_cache_stats['bytes'] = 0
+
+def route_options(start_stop, end_stop, fares=None, net=None):
+    """Pareto-optimal MTC journeys between two stops with their stop paths, fewest transfers first"""
+    net = network if net is None else net
+    options = []
+    for journey in plan_journeys(start_stop, end_stop, fares, net=net):
+        legs = []
+        for leg in journey['legs']:
+            path = route_segment(leg['route'], leg['from_pos'], leg['to_pos'], net=net)
+            legs.append({'route': leg['route'], 'path': path, 'stages': len(path) - 1})
+        options.append({
+            'legs': legs,
+            'transfers': journey['transfers'],
+            'stops': sum(len(leg['path']) for leg in legs) - len(legs) + 1,
+            'min_fare': journey['min_fare'],
+            'max_fare': journey['max_fare'],
+        })
+    return options
+
+def cached_route_options(start_stop, end_stop, fares=None):
+    """route_options through the shared LRU; callers must treat the result as read-only"""
+    key = (start_stop, end_stop)
+    net = network
+    with _route_cache_lock:
+        entry = mtc_route_cache.get(key)
+        if entry is not None:
+            mtc_route_cache.move_to_end(key)
+            route_cache_stats['hits'] += 1
+            return entry[0]
+        route_cache_stats['misses'] += 1
+
+    options = route_options(start_stop, end_stop, fares, net=net)
+    size = _approx_size(options)
+    with _route_cache_lock:
+        if net is not network:
+            return options   # the network was replaced meanwhile; don't cache old-network journeys
+        old = mtc_route_cache.pop(key, None)
+        if old is not None:
+            route_cache_stats['bytes'] -= old[1]
+        mtc_route_cache[key] = (options, size)
+        route_cache_stats['bytes'] += size
+        while mtc_route_cache and (route_cache_stats['bytes'] > ROUTE_CACHE_MAX_BYTES or
+                                   len(mtc_route_cache) > ROUTE_CACHE_MAX_ENTRIES):
+            _, (_, evicted_size) = mtc_route_cache.popitem(last=False)
+            route_cache_stats['bytes'] -= evicted_size
+            route_cache_stats['evictions'] += 1
+    return options
+
+def get_route_cache_stats():
+    with _route_cache_lock:
+        return dict(route_cache_stats, entries=len(mtc_route_cache))
+
+def is_night_departure(departure_time):
+    """Night fares apply to departures from 23:00 to 05:00; this is all build_route_steps uses the time for"""
+    if departure_time:
+        try:
+            hour = int(departure_time.split(':')[0])
+            return hour >= 23 or hour < 5
+        except:
+            pass
+    return False
 
 def build_route_steps(source_input, dest_input, source_coords, source_hub_coords, source_hub_name, 
                      hub_to_hub_distance, hub_to_hub_name,
                      dest_hub_coords, dest_hub_name,
                      dest_coords, is_bus=True, departure_time=None):
-    """Build route steps with Google Maps links, handling Chennai Bus Station as C.M.B.T, with MTC route caching."""
+    """Build route steps with Google Maps links, handling Chennai Bus Station as C.M.B.T; MTC journeys are cached per stop pair."""
     steps = []
-    is_night = False
-    if departure_time:
-        try:
-            hour = int(departure_time.split(':')[0])
-            if hour >= 23 or hour < 5:
-                is_night = True
-        except:
-            pass
+    is_night = is_night_departure(departure_time)
 
     # Initialize display names with proper default values
     source_hub_display = replace_bus_terminal_names(source_hub_name)
@@ -262,8 +648,6 @@ def build_route_steps(source_input, dest_input, source_coords, source_hub_coords
 
     # Get fares for MTC
     ordinary_fares, express_fares = get_bus_fares()
-    max_ordinary_stage = max(ordinary_fares.keys()) if ordinary_fares else 0
-    max_express_stage = max(express_fares.keys()) if express_fares else 0
 
     # Function to find MTC routes between two stops
     def find_mtc_routes(start_stop, end_stop, start_coords_mtc, end_coords_mtc):
@@ -311,140 +695,39 @@ def build_route_steps(source_input, dest_input, source_coords, source_hub_coords
         start_bus = sorted(start_bus, key=lambda x: x["distance"])[:1] if start_bus else []
         end_bus = sorted(end_bus, key=lambda x: x["distance"])[:1] if end_bus else []
 
-        # Find MTC routes
-        start_time = time.time()
-        max_duration = 10
+        # Find MTC routes: Pareto-optimal journeys on fare and transfers, fewest transfers first
+        fares = (ordinary_fares, express_fares)
         for sv in start_bus:
             for ev in end_bus:
-                pair_options = []
-                directs = []
-                for r, stops in routes.items():
-                    if sv["name"] in stops and ev["name"] in stops:
-                        try:
-                            i, j = stops.index(sv["name"]), stops.index(ev["name"])
-                            segment = stops[i:j+1] if i < j else list(reversed(stops[j:i+1]))
-                            stops_count = len(segment)
-                            stages = stops_count - 1
-                            min_fare = get_fare(stages, ordinary_fares, max_ordinary_stage)
-                            max_fare = get_fare(stages, express_fares, max_express_stage)
-                            directs.append({
-                                'type': 'direct',
-                                'route': r,
-                                'path': segment,
-                                'stops': stops_count,
-                                'stages': stages,
-                                'min_fare': min_fare,
-                                'max_fare': max_fare,
-                                'start': sv,
-                                'end': ev,
-                                'start_coords': sv.get("coords"),
-                                'end_coords': ev.get("coords")
-                            })
-                        except Exception:
-                            pass
-                for direct in directs[:1]:  # Limit to one direct route
-                    pair_options.append(direct)
-                if len(pair_options) < 1:
-                    transfers = []
-                    start_routes = sv["routes"]
-                    end_routes = ev["routes"]
-                    for r1 in start_routes:
-                        if time.time() - start_time > max_duration:
-                            break
-                        try:
-                            stops1 = routes[r1]
-                            i1 = stops1.index(sv["name"])
-                            for j1 in range(i1+1, min(i1+10, len(stops1))):
-                                transfer = stops1[j1]
-                                for r2 in end_routes:
-                                    if r2 == r1 or transfer not in routes[r2]:
-                                        continue
-                                    try:
-                                        stops2 = routes[r2]
-                                        i2 = stops2.index(transfer)
-                                        j2 = stops2.index(ev["name"])
-                                        leg1 = stops1[i1:j1+1]
-                                        leg1_stops = len(leg1)
-                                        leg1_stages = leg1_stops - 1
-                                        leg2 = stops2[i2:j2+1] if i2 < j2 else list(reversed(stops2[j2:i2+1]))
-                                        leg2_stops = len(leg2)
-                                        leg2_stages = leg2_stops - 1
-                                        min_fare_leg1 = get_fare(leg1_stages, ordinary_fares, max_ordinary_stage)
-                                        max_fare_leg1 = get_fare(leg1_stages, express_fares, max_express_stage)
-                                        min_fare_leg2 = get_fare(leg2_stages, ordinary_fares, max_ordinary_stage)
-                                        max_fare_leg2 = get_fare(leg2_stages, express_fares, max_express_stage)
-                                        min_fare_total = min_fare_leg1 + min_fare_leg2
-                                        max_fare_total = max_fare_leg1 + max_fare_leg2
-                                        transfers.append({
-                                            'type': 'transfer',
-                                            'transfer_point': transfer,
-                                            'route1': r1,
-                                            'leg1': leg1,
-                                            'leg1_stages': leg1_stages,
-                                            'route2': r2,
-                                            'leg2': leg2,
-                                            'leg2_stages': leg2_stages,
-                                            'stops': leg1_stops + leg2_stops - 1,
-                                            'min_fare': min_fare_total,
-                                            'max_fare': max_fare_total,
-                                            'start': sv,
-                                            'end': ev,
-                                        })
-                                        break
-                                    except ValueError:
-                                        continue
-                            for j1 in range(max(0, i1-10), i1):
-                                transfer = stops1[j1]
-                                for r2 in end_routes:
-                                    if r2 == r1 or transfer not in routes[r2]:
-                                        continue
-                                    try:
-                                        stops2 = routes[r2]
-                                        i2 = stops2.index(transfer)
-                                        j2 = stops2.index(ev["name"])
-                                        leg1 = list(reversed(stops1[j1:i1+1]))
-                                        leg1_stops = len(leg1)
-                                        leg1_stages = leg1_stops - 1
-                                        leg2 = stops2[i2:j2+1] if i2 < j2 else list(reversed(stops2[j2:i2+1]))
-                                        leg2_stops = len(leg2)
-                                        leg2_stages = leg2_stops - 1
-                                        min_fare_leg1 = get_fare(leg1_stages, ordinary_fares, max_ordinary_stage)
-                                        max_fare_leg1 = get_fare(leg1_stages, express_fares, max_express_stage)
-                                        min_fare_leg2 = get_fare(leg2_stages, ordinary_fares, max_ordinary_stage)
-                                        max_fare_leg2 = get_fare(leg2_stages, express_fares, max_express_stage)
-                                        min_fare_total = min_fare_leg1 + min_fare_leg2
-                                        max_fare_total = max_fare_leg1 + max_fare_leg2
-                                        transfers.append({
-                                            'type': 'transfer',
-                                            'transfer_point': transfer,
-                                            'route1': r1,
-                                            'leg1': leg1,
-                                            'leg1_stages': leg1_stages,
-                                            'route2': r2,
-                                            'leg2': leg2,
-                                            'leg2_stages': leg2_stages,
-                                            'stops': leg1_stops + leg2_stops - 1,
-                                            'min_fare': min_fare_total,
-                                            'max_fare': max_fare_total,
-                                            'start': sv,
-                                            'end': ev,
-                                        })
-                                        break
-                                    except ValueError:
-                                        continue
-                        except ValueError:
-                            continue
-                    transfers.sort(key=lambda x: x['min_fare'])
-                    for transfer in transfers[:1 - len(pair_options)]:
-                        pair_options.append(transfer)
-                all_options.extend(pair_options)
+                for journey in cached_route_options(sv["name"], ev["name"], fares):
+                    legs = journey['legs']
+                    option = dict(journey, start=sv, end=ev)
+                    if len(legs) == 1:
+                        option.update({
+                            'type': 'direct',
+                            'route': legs[0]['route'],
+                            'path': legs[0]['path'],
+                            'stages': legs[0]['stages'],
+                            'start_coords': sv.get("coords"),
+                            'end_coords': ev.get("coords")
+                        })
+                    elif len(legs) == 2:
+                        option.update({
+                            'type': 'transfer',
+                            'transfer_point': legs[0]['path'][-1],
+                            'route1': legs[0]['route'],
+                            'leg1': legs[0]['path'],
+                            'leg1_stages': legs[0]['stages'],
+                            'route2': legs[1]['route'],
+                            'leg2': legs[1]['path'],
+                            'leg2_stages': legs[1]['stages'],
+                        })
+                    else:
+                        option['type'] = 'multi'
+                    all_options.append(option)
         return all_options, start_bus, end_bus
 
 
-    # Cache key based on source_hub_name, dest_hub_name, and transport mode
-    mode = "bus" if is_bus else "train"
-    cache_key = (source_hub_name, dest_hub_name, mode)
-
     # First mile distance calculation
     first_mile_dist = geodesic(source_coords, source_hub_coords).km
     first_mode = "walk" if first_mile_dist <= 1 else "auto"
@@ -459,18 +742,13 @@ def build_route_steps(source_input, dest_input, source_coords, source_hub_coords
     )
     
     if is_special_source:
-        # Check cache for MTC routes
-        if cache_key in mtc_route_cache:
-            all_options, start_bus, end_bus = mtc_route_cache[cache_key]
-        else:
-            # Find MTC routes from source location to hub
-            all_options, start_bus, end_bus = find_mtc_routes(
-                source_input, 
-                source_hub_display,
-                source_coords, 
-                source_hub_coords
-            )
-            mtc_route_cache[cache_key] = (all_options, start_bus, end_bus)
+        # Find MTC routes from source location to hub (journeys cached per stop pair)
+        all_options, start_bus, end_bus = find_mtc_routes(
+            source_input, 
+            source_hub_display,
+            source_coords, 
+            source_hub_coords
+        )
         
         # First mile to source stop
         if start_bus:
@@ -512,12 +790,12 @@ def build_route_steps(source_input, dest_input, source_coords, source_hub_coords
                         "map_url": None
                     })
             else:
-                route_key = (option['route1'], option['route2'], option['transfer_point'])
+                route_key = tuple((leg['route'], leg['path'][-1]) for leg in option['legs'])
                 if route_key not in seen_routes:
                     seen_routes.add(route_key)
                     steps.append({
                         "mode": "bus",
-                        "description": f"MTC Bus {option['route1']} to {option['transfer_point']}, then Bus {option['route2']} to {option['end']['name']}",
+                        "description": describe_mtc_option(option),
                         "distance_km": None,
                         "fare": fare,
                         "map_url": None
@@ -549,18 +827,13 @@ def build_route_steps(source_input, dest_input, source_coords, source_hub_coords
     
     if is_special_destination:
         mtc_start = dest_hub_display
-        # Check cache for MTC routes
-        if cache_key in mtc_route_cache:
-            all_options, start_bus, end_bus = mtc_route_cache[cache_key]
-        else:
-            # Find MTC routes from hub to destination
-            all_options, start_bus, end_bus = find_mtc_routes(
-                mtc_start, 
-                dest_input,
-                dest_hub_coords, 
-                dest_coords
-            )
-            mtc_route_cache[cache_key] = (all_options, start_bus, end_bus)
+        # Find MTC routes from hub to destination (journeys cached per stop pair)
+        all_options, start_bus, end_bus = find_mtc_routes(
+            mtc_start, 
+            dest_input,
+            dest_hub_coords, 
+            dest_coords
+        )
         
         # Add MTC routes from hub
         seen_routes = set()
@@ -582,12 +855,12 @@ def build_route_steps(source_input, dest_input, source_coords, source_hub_coords
                         dest_hub_coords = option['end']['coords']
                         dest_hub_display = option['end']['name']
             else:
-                route_key = (option['route1'], option['route2'], option['transfer_point'])
+                route_key = tuple((leg['route'], leg['path'][-1]) for leg in option['legs'])
                 if route_key not in seen_routes:
                     seen_routes.add(route_key)
                     steps.append({
                         "mode": "bus",
-                        "description": f"MTC Bus {option['route1']} to {option['transfer_point']}, then Bus {option['route2']} to {option['end']['name']}",
+                        "description": describe_mtc_option(option),
                         "distance_km": None,
                         "fare": fare,
                         "map_url": None
@@ -614,10 +887,7 @@ def build_route_steps(source_input, dest_input, source_coords, source_hub_coords
 
     return steps
 
-def calculate_total_fare(route_steps, provider_fare):
-    """Calculate total fare including transport and first/last mile"""
-    total_min = 0
-    total_max = 0
+def parse_provider_fare(provider_fare):
     provider_value = 0
     try:
         if provider_fare:
@@ -626,6 +896,15 @@ def calculate_total_fare(route_steps, provider_fare):
                 provider_value = float(match.group(1).replace(',', ''))
     except:
         pass
+    return provider_value
+
+def fare_template(route_steps):
+    """
+    The provider-independent part of calculate_total_fare: (min, max) of the other steps'
+    fares and the index of the hub step that takes the provider fare (None if there is none)
+    """
+    total_min = 0
+    total_max = 0
     for step in route_steps[1:]:
         if step.get('fare'):
             if isinstance(step['fare'], tuple):
@@ -634,13 +913,34 @@ def calculate_total_fare(route_steps, provider_fare):
             else:
                 total_min += step['fare']
                 total_max += step['fare']
-    for step in route_steps:
-        if step['mode'] in ('bus', 'train') and step.get('fare') is None:
-            step['fare'] = provider_value
-            total_min += provider_value
-            total_max += provider_value
-            break
-    return f"₹{total_min:.0f} - ₹{total_max:.0f}", route_steps
+    hub_index = next((i for i, step in enumerate(route_steps)
+                      if step['mode'] in ('bus', 'train') and step.get('fare') is None), None)
+    return total_min, total_max, hub_index
+
+def fill_provider_fare(route_steps, template, provider_fare):
+    """(total min, total max, steps) for a shared plan: the steps are copied, not filled in place"""
+    total_min, total_max, hub_index = template
+    provider_value = parse_provider_fare(provider_fare)
+    route_steps = list(route_steps)
+    if hub_index is not None:
+        route_steps[hub_index] = dict(route_steps[hub_index], fare=provider_value)
+        total_min += provider_value
+        total_max += provider_value
+    return total_min, total_max, route_steps
+
+def format_total_fare(total_min, total_max):
+    return f"₹{total_min:.0f} - ₹{total_max:.0f}"
+
+def apply_provider_fare(route_steps, template, provider_fare):
+    """calculate_total_fare for a shared plan: the steps are copied, not filled in place"""
+    total_min, total_max, route_steps = fill_provider_fare(route_steps, template, provider_fare)
+    return format_total_fare(total_min, total_max), route_steps
+
+def calculate_total_fare(route_steps, provider_fare):
+    """Calculate total fare including transport and first/last mile"""
+    total_cost, filled = apply_provider_fare(route_steps, fare_template(route_steps), provider_fare)
+    route_steps[:] = filled
+    return total_cost, route_steps
 
 
 def generate_route_details(steps):
@@ -659,7 +959,7 @@ def generate_route_details(steps):
         if step.get("distance_km") is not None:
             details.append(f"{step['distance_km']:.1f} km")
         if step.get("fare"):
-            if isinstance(step['fare'], tuple):
+            if isinstance(step['fare'], (tuple, list)):
                 details.append(f"₹{step['fare'][0]}-₹{step['fare'][1]}")
             else:
                 details.append(f"₹{step['fare']}")
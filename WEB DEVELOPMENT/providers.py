@@ -0,0 +1,190 @@
+import time
+import inspect
+import logging
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+import aio_http
+from tn import get_tnstc_bus_schedules, get_tnstc_bus_schedules_async
+from redbus import get_redbus_schedules
+from abhibus import get_abhibus_schedules, get_abhibus_city_id
+from IRCTC import get_irctc_api_response, get_irctc_api_response_async, search_station, parse_train_schedules
+
+# Shared, bounded pool for provider calls (Selenium scrapes are heavy, keep it small)
+MAX_PROVIDER_WORKERS = 8
+provider_executor = ThreadPoolExecutor(max_workers=MAX_PROVIDER_WORKERS, thread_name_prefix="provider")
+
+# Per-provider deadlines in seconds, measured from the start of the fan-out
+PROVIDER_DEADLINES = {
+    'TNSTC': 30,
+    'AbhiBus': 60,
+    'RedBus': 60,
+    'IRCTC': 45,
+}
+DEFAULT_DEADLINE = 60
+
+def fan_out(tasks, deadlines=None):
+    """
+    Run provider callables concurrently and yield (name, rows) as each one finishes.
+    tasks: dict of provider name -> zero-argument callable returning a list. Coroutine
+    functions run on the shared aio_http loop instead of taking a pool thread.
+    rows is None for a provider that raised or missed its deadline, so callers can tell
+    a failure from "no schedules" ([]) and merge partial results either way.
+
+    Missing a deadline only stops us waiting: a coroutine is cancelled, but a scrape that
+    is already running in a pool thread cannot be interrupted. It keeps its worker (and
+    any browser it took from browser_pool) until it returns, and its rows are dropped.
+    """
+    deadlines = deadlines or PROVIDER_DEADLINES
+    start = time.time()
+    pending = {}
+    for name, fn in tasks.items():
+        if inspect.iscoroutinefunction(fn):
+            future = aio_http.submit(fn())
+        else:
+            future = provider_executor.submit(fn)
+        pending[future] = (name, start + deadlines.get(name, DEFAULT_DEADLINE))
+
+    while pending:
+        next_deadline = min(d for _, d in pending.values())
+        timeout = max(0, next_deadline - time.time())
+        done, _ = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+
+        for future in done:
+            name, _ = pending.pop(future)
+            try:
+                rows = future.result() or []
+            except Exception as e:
+                logging.error(f"{name} provider failed: {e}")
+                yield name, None
+                continue
+            logging.info(f"{name}: {len(rows)} results after {time.time() - start:.1f}s")
+            yield name, rows
+
+        # Stop waiting for providers whose deadline has passed. cancel() only takes effect
+        # for coroutines and tasks that haven't started; a running scrape finishes unobserved.
+        now = time.time()
+        for future, (name, deadline) in list(pending.items()):
+            if now >= deadline:
+                pending.pop(future)
+                future.cancel()
+                logging.warning(f"{name} provider missed its {deadline - start:.0f}s deadline, no longer waiting for it")
+                yield name, None
+
+def _tnstc_combinations(source_city, destination_city, source_bus_stand_info, dest_bus_stand_info):
+    """City and "Bus Stand" name pairs to try against TNSTC, in order"""
+    tnstc_source_try = []
+    tnstc_dest_try = []
+    if source_city:
+        tnstc_source_try.append(source_city)
+        if source_bus_stand_info:
+            tnstc_source_try.append(f"{source_city} Bus Stand")
+    if destination_city:
+        tnstc_dest_try.append(destination_city)
+        if dest_bus_stand_info:
+            tnstc_dest_try.append(f"{destination_city} Bus Stand")
+    return [(sc, dc) for sc in tnstc_source_try for dc in tnstc_dest_try]
+
+def fetch_tnstc(source_city, destination_city, source_bus_stand_info, dest_bus_stand_info, date_tnstc):
+    """TNSTC: try combinations of city and "Bus Stand" until one returns schedules"""
+    for sc, dc in _tnstc_combinations(source_city, destination_city, source_bus_stand_info, dest_bus_stand_info):
+        logging.info(f"Checking TNSTC direct schedules for '{sc}' -> '{dc}' on {date_tnstc}")
+        tn_results = get_tnstc_bus_schedules(sc.lower().strip(), dc.lower().strip(), date_tnstc)
+        if tn_results:
+            for r in tn_results:
+                r['booking_url'] = "https://www.tnstc.in"
+            return tn_results
+    logging.info(f"TNSTC: no schedules found for any combination for '{source_city}' -> '{destination_city}'")
+    return []
+
+async def fetch_tnstc_async(source_city, destination_city, source_bus_stand_info, dest_bus_stand_info, date_tnstc):
+    """fetch_tnstc on the shared aio_http session"""
+    for sc, dc in _tnstc_combinations(source_city, destination_city, source_bus_stand_info, dest_bus_stand_info):
+        logging.info(f"Checking TNSTC direct schedules for '{sc}' -> '{dc}' on {date_tnstc}")
+        tn_results = await get_tnstc_bus_schedules_async(sc.lower().strip(), dc.lower().strip(), date_tnstc)
+        if tn_results:
+            for r in tn_results:
+                r['booking_url'] = "https://www.tnstc.in"
+            return tn_results
+    logging.info(f"TNSTC: no schedules found for any combination for '{source_city}' -> '{destination_city}'")
+    return []
+
+def fetch_abhibus(source_city, destination_city, source_bus_stand_info, dest_bus_stand_info, date_bus_abhibus):
+    """AbhiBus: resolve city IDs (city, then "Bus Stand") and scrape the search page"""
+    abhi_src_id = None
+    abhi_dest_id = None
+    if source_city:
+        for sc in [source_city] + ([f"{source_city} Bus Stand"] if source_bus_stand_info else []):
+            sc_l = sc.lower().strip()
+            abhi_src_id = get_abhibus_city_id(sc_l)
+            if abhi_src_id:
+                logging.info(f"AbhiBus: found city ID for source '{sc_l}': {abhi_src_id}")
+                break
+    if destination_city:
+        for dc in [destination_city] + ([f"{destination_city} Bus Stand"] if dest_bus_stand_info else []):
+            dc_l = dc.lower().strip()
+            abhi_dest_id = get_abhibus_city_id(dc_l)
+            if abhi_dest_id:
+                logging.info(f"AbhiBus: found city ID for dest '{dc_l}': {abhi_dest_id}")
+                break
+    if not (abhi_src_id and abhi_dest_id):
+        logging.info(f"AbhiBus fallback: could not obtain city IDs for '{source_city}' or '{destination_city}'")
+        return []
+    url_ab = f"https://www.abhibus.com/bus_search/{source_city.lower().strip()}/{abhi_src_id}/{destination_city.lower().strip()}/{abhi_dest_id}/{date_bus_abhibus}/O"
+    logging.info(f"Checking AbhiBus direct schedules with URL: {url_ab}")
+    return get_abhibus_schedules(url_ab)
+
+def fetch_redbus(source_city, destination_city, date_redbus):
+    """RedBus: build the search URL from city slugs and scrape it"""
+    src_rb = source_city.lower().strip().replace(' ', '-')
+    dst_rb = destination_city.lower().strip().replace(' ', '-')
+    rb_search_url = f"https://www.redbus.in/bus-tickets/{src_rb}-to-{dst_rb}/?fromCityName={source_city}&toCityName={destination_city}&onward={date_redbus}&doj={date_redbus}"
+    logging.info(f"Checking RedBus direct schedules for {source_city.lower().strip()} -> {destination_city.lower().strip()} on {date_redbus}")
+    rb_results = get_redbus_schedules(rb_search_url) or []
+    for r in rb_results:
+        r['booking_url'] = rb_search_url
+    return rb_results
+
+def _irctc_station_codes(station_data, src_station, dest_station):
+    """Map nearby stations to IRCTC codes (with Chennai fallbacks); None if either is unknown"""
+    logging.info(f"Searching trains for stations: {src_station['name']} -> {dest_station['name']}")
+    m_src = search_station(station_data, src_station['name'])
+    m_dest = search_station(station_data, dest_station['name'])
+
+    # Special handling for Chennai if no exact match
+    if not m_src and 'CHENNAI' in src_station['name'].upper():
+        m_src = search_station(station_data, "CHENNAI CENTRAL")
+        if not m_src:
+            m_src = search_station(station_data, "CHENNAI EGMORE")
+        if m_src:
+            logging.info(f"Using Chennai station fallback: {m_src[0][0]}")
+
+    if not m_dest and 'CHENNAI' in dest_station['name'].upper():
+        m_dest = search_station(station_data, "CHENNAI CENTRAL")
+        if not m_dest:
+            m_dest = search_station(station_data, "CHENNAI EGMORE")
+        if m_dest:
+            logging.info(f"Using Chennai station fallback: {m_dest[0][0]}")
+
+    if not (m_src and m_dest):
+        logging.info(f"Train search: could not map station codes for '{src_station['name']}' or '{dest_station['name']}'")
+        return None
+    return m_src[0][1], m_dest[0][1]
+
+def fetch_irctc(station_data, src_station, dest_station, date_irctc):
+    """IRCTC: map nearby stations to codes (with Chennai fallbacks) and query the API"""
+    codes = _irctc_station_codes(station_data, src_station, dest_station)
+    if not codes:
+        return []
+    src_code, dest_code = codes
+    logging.info(f"Checking Train direct schedules from station {src_station['name']} ({src_code}) to {dest_station['name']} ({dest_code}) on {date_irctc}")
+    api_resp = get_irctc_api_response(src_code, dest_code, date_irctc)
+    return parse_train_schedules(api_resp)
+
+async def fetch_irctc_async(station_data, src_station, dest_station, date_irctc):
+    """fetch_irctc on the shared aio_http session"""
+    codes = _irctc_station_codes(station_data, src_station, dest_station)
+    if not codes:
+        return []
+    src_code, dest_code = codes
+    logging.info(f"Checking Train direct schedules from station {src_station['name']} ({src_code}) to {dest_station['name']} ({dest_code}) on {date_irctc}")
+    api_resp = await get_irctc_api_response_async(src_code, dest_code, date_irctc)
+    return parse_train_schedules(api_resp)
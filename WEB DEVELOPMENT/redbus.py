@@ -1,6 +1,3 @@
-from selenium import webdriver
-from selenium.webdriver.edge.service import Service as EdgeService
-from selenium.webdriver.edge.options import Options as EdgeOptions
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
@@ -8,9 +5,70 @@ from selenium.common.exceptions import NoSuchElementException, TimeoutException,
 from bs4 import BeautifulSoup
 import re
 import time
-import tempfile
-import os
 import logging
+from collections import deque
+from browser_pool import driver_pool
+
+RESULT_ITEM_SELECTOR = "div.sectionWrapper__ind-search-styles-module-scss-AITjK li"
+INITIAL_LOAD_TIMEOUT = 15     # max wait for the first results to render
+SCROLL_LOAD_TIMEOUT = 4       # max wait for more results after a scroll
+NETWORK_IDLE_SECONDS = 0.75   # nothing in flight, no finished requests and no row changes for this long -> done
+MAX_SCROLLS = 30
+MAX_SCROLL_SECONDS = 40       # overall ceiling for the scroll phase
+POLL_INTERVAL = 0.2
+
+# Recent per-search timings, newest last
+SCRAPE_TIMINGS = deque(maxlen=100)
+
+# Resource timing entries only appear once a request has finished (and stop at the
+# buffer size, 250 by default), so XHR/fetch calls are also counted while in flight.
+TRACK_REQUESTS_JS = """
+if (!window.__rbInflightHooked) {
+    window.__rbInflightHooked = true;
+    window.__rbInflight = 0;
+    const send = XMLHttpRequest.prototype.send;
+    XMLHttpRequest.prototype.send = function() {
+        window.__rbInflight++;
+        this.addEventListener('loadend', function() { window.__rbInflight--; }, {once: true});
+        return send.apply(this, arguments);
+    };
+    if (window.fetch) {
+        const fetch = window.fetch;
+        window.fetch = function() {
+            window.__rbInflight++;
+            return fetch.apply(this, arguments).finally(function() { window.__rbInflight--; });
+        };
+    }
+}
+performance.setResourceTimingBufferSize(1000);
+"""
+
+def _network_state(driver):
+    """(requests in flight, finished resource entries since the last clear)"""
+    return tuple(driver.execute_script(
+        "return [window.__rbInflight || 0, performance.getEntriesByType('resource').length]"))
+
+def _more_results_loaded(prev_count):
+    """
+    Wait condition: returns the new count once it grows past prev_count, or 'idle' once
+    for NETWORK_IDLE_SECONDS nothing was in flight, no request finished and the row
+    count stayed the same.
+    """
+    state = {'snapshot': None, 'quiet_since': time.time()}
+
+    def condition(driver):
+        count = len(driver.find_elements(By.CSS_SELECTOR, RESULT_ITEM_SELECTOR))
+        if count > prev_count:
+            return count
+        inflight, resources = _network_state(driver)
+        snapshot = (count, resources)
+        if inflight > 0 or snapshot != state['snapshot']:
+            state['snapshot'] = snapshot
+            state['quiet_since'] = time.time()
+        elif time.time() - state['quiet_since'] >= NETWORK_IDLE_SECONDS:
+            return 'idle'
+        return False
+    return condition
 
 def get_fully_scrolled_html(url):
     """Scroll RedBus page fully via Selenium to load all results.
@@ -21,74 +79,54 @@ def get_fully_scrolled_html(url):
     Returns:
         str: Fully loaded page HTML or None if failed
     """
-    # Configure Edge options for Docker compatibility
-    options = EdgeOptions()
-    options.add_argument("--headless=new")
-    options.add_argument("--disable-gpu")
-    options.add_argument("--no-sandbox")  # Essential for Docker
-    options.add_argument("--disable-dev-shm-usage")  # Prevents /dev/shm issues
-    options.add_argument("--window-size=1920,1080")
-    options.add_argument("--disable-blink-features=AutomationControlled")
-    options.add_experimental_option("excludeSwitches", ["enable-automation"])
-    options.add_experimental_option("useAutomationExtension", False)
-    options.add_argument("user-agent=Mozilla/5.0")
-    
-    # Create unique temp directory for browser profile
-    temp_dir = tempfile.mkdtemp()
-    options.add_argument(f"--user-data-dir={temp_dir}")
-    
-    driver = None
+    timing = {'url': url, 'load': None, 'scroll': 0.0, 'scrolls': 0, 'items': 0, 'total': None}
+    start = time.time()
     try:
-        # Initialize WebDriver with Docker-compatible path
-        service = EdgeService(
-            executable_path=r'S:\Project\example\webdriver\msedgedriver.exe',  # Docker path
-            service_args=['--verbose']  # Enable logging if needed
-        )
-        driver = webdriver.Edge(service=service, options=options)
-        
-        # Mask Selenium detection
-        driver.execute_script(
-            "Object.defineProperty(navigator, 'webdriver', {get: () => undefined})"
-        )
-        
-        # Load initial page
-        driver.get(url)
-        time.sleep(5)  # Initial load wait
-        
-        # Scroll to load all results
-        prev_count = 0
-        same_count = 0
-        max_attempts = 10  # Prevent infinite loops
-        attempts = 0
-        
-        while attempts < max_attempts:
-            attempts += 1
-            items = driver.find_elements(
-                By.CSS_SELECTOR, 
-                "div.sectionWrapper__ind-search-styles-module-scss-AITjK li"
-            )
-            current_count = len(items)
+        # Borrow a warm browser from the shared pool
+        with driver_pool.driver() as driver:
+            # Load initial page and wait for the first rows instead of a fixed sleep
+            driver.get(url)
+            try:
+                WebDriverWait(driver, INITIAL_LOAD_TIMEOUT, poll_frequency=POLL_INTERVAL).until(
+                    EC.presence_of_element_located((By.CSS_SELECTOR, RESULT_ITEM_SELECTOR))
+                )
+            except TimeoutException:
+                logging.info("RedBus: no results rendered within initial load timeout")
+                return driver.page_source
+            finally:
+                timing['load'] = round(time.time() - start, 2)
             
-            # Check if we've stopped loading new items
-            if current_count == prev_count:
-                same_count += 1
-                if same_count >= 2:  # Consistent count for 2 checks
+            # Scroll to the last row until the count stops growing
+            driver.execute_script(TRACK_REQUESTS_JS)
+            scroll_start = time.time()
+            items = driver.find_elements(By.CSS_SELECTOR, RESULT_ITEM_SELECTOR)
+            while items:
+                if timing['scrolls'] >= MAX_SCROLLS or time.time() - scroll_start > MAX_SCROLL_SECONDS:
+                    logging.warning(f"RedBus: scroll limit reached with {len(items)} rows, results may be incomplete")
                     break
-            else:
-                same_count = 0
-                prev_count = current_count
-            
-            # Scroll to last item if found
-            if items:
+                timing['scrolls'] += 1
+                driver.execute_script("performance.clearResourceTimings();")
                 driver.execute_script(
-                    "arguments[0].scrollIntoView({behavior: 'smooth', block: 'center'});", 
+                    "arguments[0].scrollIntoView({behavior: 'instant', block: 'center'});", 
                     items[-1]
                 )
-                time.sleep(3)  # Allow loading after scroll
-            else:
-                break
-        
-        return driver.page_source
+                try:
+                    loaded = WebDriverWait(driver, SCROLL_LOAD_TIMEOUT, poll_frequency=POLL_INTERVAL).until(
+                        _more_results_loaded(len(items))
+                    )
+                except TimeoutException:
+                    inflight, _ = _network_state(driver)
+                    if inflight:
+                        logging.warning(f"RedBus: {inflight} request(s) still loading after {SCROLL_LOAD_TIMEOUT}s, "
+                                        f"results may be incomplete ({len(items)} rows)")
+                    break
+                if loaded == 'idle':
+                    break
+                items = driver.find_elements(By.CSS_SELECTOR, RESULT_ITEM_SELECTOR)
+            timing['scroll'] = round(time.time() - scroll_start, 2)
+            timing['items'] = len(items)
+            
+            return driver.page_source
         
     except WebDriverException as e:
         logging.error(f"WebDriver error during RedBus scroll: {e}")
@@ -97,19 +135,14 @@ def get_fully_scrolled_html(url):
         logging.error(f"Unexpected error scrolling RedBus: {e}")
         return None
     finally:
-        # Clean up resources
-        try:
-            if driver:
-                driver.quit()
-        except Exception as e:
-            logging.error(f"Error closing driver: {e}")
-        
-        # Clean up temp directory
-        try:
-            if os.path.exists(temp_dir):
-                os.system(f"rm -rf {temp_dir}")
-        except Exception as e:
-            logging.error(f"Error cleaning temp directory: {e}")
+        timing['total'] = round(time.time() - start, 2)
+        SCRAPE_TIMINGS.append(timing)
+        logging.info(f"RedBus scrape timing: load={timing['load']}s scroll={timing['scroll']}s "
+                     f"scrolls={timing['scrolls']} items={timing['items']} total={timing['total']}s")
+
+def get_scrape_timings():
+    """Recent RedBus scrape timings (dicts with load/scroll/total seconds)"""
+    return list(SCRAPE_TIMINGS)
 
 def extract_redbus_details(html):
     """Parse RedBus HTML for bus listings."""
@@ -0,0 +1,173 @@
+import re
+import time
+import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from search_pipeline import resolve_search, iter_search, PROVIDER_ORDER
+
+# Search result cache keyed by normalized (source, destination, date, mode).
+# Each provider's rows carry their own fetch time: seat counts and dynamic fares go
+# stale quickly, train schedules slowly. Stale rows are served immediately while a
+# background refresh re-fetches just the stale providers. Providers that failed or timed
+# out are not cached; they count as stale, so the next lookup retries them.
+PROVIDER_TTLS = {
+    'TNSTC': 5 * 60,       # seat availability
+    'AbhiBus': 10 * 60,    # dynamic fares / seats
+    'RedBus': 10 * 60,
+    'IRCTC': 6 * 3600,     # schedule and class list
+}
+DEFAULT_TTL = 10 * 60
+MAX_STALE = 24 * 3600      # older than this is not worth showing, search again
+MAX_ENTRIES = 512
+
+_cache = OrderedDict()
+_lock = threading.Lock()
+_refreshing = set()
+refresh_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="result-refresh")
+stats = {'hits': 0, 'stale_hits': 0, 'misses': 0, 'refreshes': 0}
+
+def normalize_place(text):
+    return re.sub(r'\s+', ' ', re.sub(r'[^\w\s,]', '', (text or '').lower())).strip()
+
+def cache_key(source, destination, date, mode):
+    return (normalize_place(source), normalize_place(destination), (date or '').strip(), mode)
+
+def _stale_providers(entry, now):
+    """Providers past their TTL plus those that failed last time; call with _lock held"""
+    stale = [name for name, part in entry['providers'].items()
+             if now - part['fetched_at'] > PROVIDER_TTLS.get(name, DEFAULT_TTL)]
+    return stale + [name for name in entry['failed'] if name not in stale]
+
+def provider_parts(entry):
+    """(provider, rows) for the cached providers in the usual provider order"""
+    providers = entry['providers']   # replaced, never mutated, by _refresh
+    return [(name, providers[name]['rows']) for name in PROVIDER_ORDER if name in providers]
+
+def assemble(entry):
+    """Flatten cached provider rows into one result list in the usual provider order"""
+    results = []
+    for _, rows in provider_parts(entry):
+        results.extend(rows)
+    return results
+
+def lookup(key):
+    """Return a servable cached entry (possibly stale, triggering a refresh) or None"""
+    now = time.time()
+    with _lock:
+        entry = _cache.get(key)
+        if entry is None:
+            stats['misses'] += 1
+            return None
+        oldest = min((p['fetched_at'] for p in entry['providers'].values()), default=entry['created'])
+        if now - oldest > MAX_STALE:
+            del _cache[key]
+            stats['misses'] += 1
+            return None
+        _cache.move_to_end(key)
+        stale = _stale_providers(entry, now)
+        stats['stale_hits' if stale else 'hits'] += 1
+    if stale:
+        schedule_refresh(key, stale)
+    return entry
+
+def store(key, ctx, provider_rows):
+    """
+    Cache a finished search; provider_rows is {provider: entries, or None if it failed}.
+    Failed providers are left out (and retried on the next lookup). A search where no
+    provider returned anything is not cached at all. Returns the entry either way.
+    """
+    now = time.time()
+    entry = {
+        'ctx': ctx,
+        'created': now,
+        'providers': {name: {'rows': rows, 'fetched_at': now}
+                      for name, rows in provider_rows.items() if rows is not None},
+        'failed': frozenset(name for name, rows in provider_rows.items() if rows is None),
+    }
+    if not any(part['rows'] for part in entry['providers'].values()):
+        logging.info(f"Not caching search {key}: no provider returned results")
+        return entry
+    with _lock:
+        _cache[key] = entry
+        _cache.move_to_end(key)
+        while len(_cache) > MAX_ENTRIES:
+            _cache.popitem(last=False)
+    return entry
+
+def _refresh(key, providers):
+    try:
+        with _lock:
+            entry = _cache.get(key)
+        if entry is None:
+            return
+        logging.info(f"Refreshing cached search {key} for {', '.join(providers)}")
+        fresh, failed = {}, set()
+        for name, rows in iter_search(entry['ctx'], only=providers):
+            if rows is None:
+                failed.add(name)   # keep serving the old rows, retry on a later lookup
+            else:
+                fresh[name] = {'rows': rows, 'fetched_at': time.time()}
+        # Readers hold on to entry['providers'], so swap in a new dict instead of editing it
+        with _lock:
+            updated = dict(entry['providers'])
+            updated.update(fresh)
+            entry['providers'] = updated
+            entry['failed'] = frozenset((entry['failed'] - set(fresh)) | failed)
+            stats['refreshes'] += 1
+    except Exception as e:
+        logging.error(f"Background refresh failed for {key}: {e}")
+    finally:
+        with _lock:
+            _refreshing.discard(key)
+
+def schedule_refresh(key, providers):
+    with _lock:
+        if key in _refreshing:
+            return
+        _refreshing.add(key)
+    refresh_executor.submit(_refresh, key, providers)
+
+def cached_search(source, destination, date, mode):
+    """
+    Full search through the cache. Returns (ctx, results, error); a hit (fresh or stale)
+    skips geocoding and every provider call.
+    """
+    key = cache_key(source, destination, date, mode)
+    entry = lookup(key)
+    if entry is not None:
+        return entry['ctx'], assemble(entry), None
+
+    ctx, error = resolve_search(source, destination, date, mode)
+    if error:
+        return ctx, [], error
+    provider_rows = dict(iter_search(ctx))
+    entry = store(key, ctx, provider_rows)
+    return ctx, assemble(entry), None
+
+def _search_and_store(key, ctx):
+    provider_rows = {}
+    for name, rows in iter_search(ctx):
+        provider_rows[name] = rows
+        yield name, rows
+    store(key, ctx, provider_rows)
+
+def stream_search(source, destination, date, mode):
+    """
+    cached_search for streaming responses. Returns (ctx, error, parts) where parts yields
+    (provider, entries) as each provider completes; the search is cached once parts is
+    exhausted. A cache hit yields every provider straight away in the usual order.
+    """
+    key = cache_key(source, destination, date, mode)
+    entry = lookup(key)
+    if entry is not None:
+        return entry['ctx'], None, iter(provider_parts(entry))
+
+    ctx, error = resolve_search(source, destination, date, mode)
+    if error:
+        return ctx, error, iter(())
+    return ctx, None, _search_and_store(key, ctx)
+
+def get_cache_stats():
+    with _lock:
+        return dict(stats, entries=len(_cache), refreshing=len(_refreshing))
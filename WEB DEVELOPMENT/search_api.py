@@ -0,0 +1,206 @@
+import re
+import gzip
+import json
+from mtc import parse_provider_fare
+
+try:
+    import brotli  # optional; gzip is always available
+except ImportError:
+    brotli = None
+
+# Typed JSON for /api/search: the same rows the HTML view shows, with fares as numbers
+# and route steps as objects instead of the markup from generate_route_details.
+SCHEMA_VERSION = 1
+MODES = ('bus', 'train', 'both')
+COMPRESS_MIN_BYTES = 1024   # smaller bodies aren't worth the CPU
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+
+def _nullable(json_type):
+    return {'type': [json_type, 'null']}
+
+_range = {'type': ['object', 'null'], 'properties': {'min': {'type': 'number'}, 'max': {'type': 'number'}},
+          'required': ['min', 'max']}
+_point = {'type': ['array', 'null'], 'items': {'type': 'number'}, 'minItems': 2, 'maxItems': 2,
+          'description': '[lat, lon]'}
+_place = {'type': ['object', 'null'], 'properties': {'name': {'type': 'string'}, 'coords': _point}}
+_endpoint = {
+    'type': 'object',
+    'properties': {
+        'input': {'type': 'string'}, 'coords': _point, 'city': _nullable('string'), 'city_coords': _point,
+        'bus_stand': _place, 'station': _place,
+    },
+}
+STEP_SCHEMA = {
+    'type': 'object',
+    'properties': {
+        'mode': {'enum': ['you', 'walk', 'auto', 'cab', 'bus', 'train']},
+        'description': {'type': 'string'},
+        'distance_km': _nullable('number'),
+        'fare': _range,
+        'map_url': _nullable('string'),
+    },
+    'required': ['mode', 'description', 'distance_km', 'fare', 'map_url'],
+}
+RESULT_SCHEMA = {
+    'type': 'object',
+    'properties': {
+        'provider': {'enum': ['TNSTC', 'AbhiBus', 'RedBus', 'IRCTC']},
+        'operator': {'type': 'string'},
+        'departure': dict(_nullable('string'), description='HH:MM as the provider lists it'),
+        'arrival': _nullable('string'),
+        'duration': _nullable('string'),
+        'duration_minutes': _nullable('integer'),
+        'fare': dict(_nullable('number'), description='Ticket fare in INR; null when the provider gave none'),
+        'classes': {'type': ['array', 'null'], 'items': {'type': 'string'}},
+        'total_cost': dict(_range, description='Door-to-door cost in INR including first/last mile'),
+        'route_steps': {'type': 'array', 'items': STEP_SCHEMA},
+        'booking_link': _nullable('string'),
+    },
+}
+RESULT_FIELDS = tuple(RESULT_SCHEMA['properties'])
+SEARCH_SCHEMA = {
+    '$schema': 'https://json-schema.org/draft/2020-12/schema',
+    'title': 'Journey Planner TN search',
+    'type': 'object',
+    'properties': {
+        'version': {'const': SCHEMA_VERSION},
+        'query': {
+            'type': 'object',
+            'properties': {'source': {'type': 'string'}, 'destination': {'type': 'string'},
+                           'date': {'type': 'string', 'format': 'date'}, 'mode': {'enum': list(MODES)}},
+        },
+        'context': {
+            'type': 'object',
+            'properties': {
+                'source': _endpoint, 'destination': _endpoint,
+                'hub_to_hub': {'type': 'object', 'properties': {'name': _nullable('string'),
+                                                                'distance_km': _nullable('number')}},
+            },
+        },
+        'currency': {'const': 'INR'},
+        'count': {'type': 'integer'},
+        'results': {'type': 'array', 'items': RESULT_SCHEMA},
+        'error': _nullable('string'),
+    },
+    'required': ['version', 'query', 'results', 'error'],
+}
+
+def _text(value):
+    """Provider strings with the 'N/A'/empty placeholders turned into None"""
+    if value is None:
+        return None
+    value = str(value).strip()
+    return None if value in ('', 'N/A') else value
+
+def duration_minutes(text):
+    """Minutes from '05:30', '5h 30m', '5 hrs 30 mins' style durations, else None"""
+    text = _text(text)
+    if not text:
+        return None
+    m = re.fullmatch(r'(\d{1,2}):(\d{2})', text)
+    if m:
+        return int(m.group(1)) * 60 + int(m.group(2))
+    hours = re.search(r'(\d+)\s*h', text, re.IGNORECASE)
+    minutes = re.search(r'(\d+)\s*m', text, re.IGNORECASE)
+    if not hours and not minutes:
+        return None
+    return (int(hours.group(1)) * 60 if hours else 0) + (int(minutes.group(1)) if minutes else 0)
+
+def _fare_range(fare):
+    if fare is None:
+        return None
+    if isinstance(fare, (tuple, list)):
+        return {'min': fare[0], 'max': fare[1]}
+    return {'min': fare, 'max': fare}
+
+def _coords(coords):
+    return [coords[0], coords[1]] if coords else None
+
+def serialize_step(step):
+    return {
+        'mode': step['mode'],
+        'description': step['description'],
+        'distance_km': step.get('distance_km'),
+        'fare': _fare_range(step.get('fare')),
+        'map_url': step.get('map_url'),
+    }
+
+def serialize_result(r):
+    """One result row (search_pipeline.bus_entry / train_entry) as a RESULT_SCHEMA object"""
+    steps = r.get('route_steps') or []
+    # IRCTC rows show the class list in 'fare'; bus fares parse the way the totals do (0 = none given)
+    fare = None if r.get('provider') == 'IRCTC' else parse_provider_fare(r.get('fare'))
+    return {
+        'provider': r.get('provider'),
+        'operator': r.get('operator'),
+        'departure': _text(r.get('departure')),
+        'arrival': _text(r.get('arrival')),
+        'duration': _text(r.get('duration')),
+        'duration_minutes': duration_minutes(r.get('duration')),
+        'fare': fare or None,
+        'classes': r.get('classes'),
+        'total_cost': _fare_range(r.get('total_cost_range')),   # the numbers behind the row's total_cost text
+        'route_steps': [serialize_step(s) for s in steps],
+        'booking_link': r.get('booking_link'),
+    }
+
+def _endpoint_context(ctx, side):
+    if side == 'source':
+        stand, station = ctx.get('source_bus_stand_info'), ctx.get('src_station')
+        keys = ('source_input', 'source_coords', 'source_city', 'source_city_coords')
+    else:
+        stand, station = ctx.get('dest_bus_stand_info'), ctx.get('dest_station')
+        keys = ('dest_input', 'dest_coords', 'destination_city', 'dest_city_coords')
+    return {
+        'input': ctx.get(keys[0]),
+        'coords': _coords(ctx.get(keys[1])),
+        'city': ctx.get(keys[2]) or None,
+        'city_coords': _coords(ctx.get(keys[3])),
+        'bus_stand': {'name': stand['name'], 'coords': _coords(stand['coords'])} if stand else None,
+        'station': {'name': station['name'], 'coords': _coords(station['coords'])} if station else None,
+    }
+
+def parse_fields(fields_param):
+    """'provider,fare' -> ('provider', 'fare'); None keeps every field. Raises ValueError on unknown names."""
+    if not fields_param:
+        return None
+    fields = tuple(f.strip() for f in fields_param.split(',') if f.strip())
+    unknown = [f for f in fields if f not in RESULT_FIELDS]
+    if unknown:
+        raise ValueError(f"Unknown field(s): {', '.join(unknown)}. Valid fields: {', '.join(RESULT_FIELDS)}")
+    return fields
+
+def serialize_search(ctx, results, error=None, fields=None):
+    """The whole /api/search document; fields limits each result to those keys"""
+    rows = [serialize_result(r) for r in results]
+    if fields is not None:
+        rows = [{f: row[f] for f in fields} for row in rows]
+    return {
+        'version': SCHEMA_VERSION,
+        'query': {'source': ctx.get('source_input'), 'destination': ctx.get('dest_input'),
+                  'date': ctx.get('date_input'), 'mode': ctx.get('mode')},
+        'context': {
+            'source': _endpoint_context(ctx, 'source'),
+            'destination': _endpoint_context(ctx, 'destination'),
+            'hub_to_hub': {'name': ctx.get('hub_to_hub_name') or None,
+                           'distance_km': ctx.get('hub_to_hub_distance')},
+        },
+        'currency': 'INR',
+        'count': len(rows),
+        'results': rows,
+        'error': error,
+    }
+
+def encodings():
+    """Content-Encodings we can produce, in order of preference"""
+    return ('br', 'gzip') if brotli is not None else ('gzip',)
+
+def encode_json(document, encoding=None):
+    """(body bytes, Content-Encoding or None); encoding is what the client accepts, see encodings()"""
+    body = json.dumps(document, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+    if len(body) < COMPRESS_MIN_BYTES or encoding not in encodings():
+        return body, None
+    if encoding == 'br':
+        return brotli.compress(body, quality=BROTLI_QUALITY), 'br'
+    return gzip.compress(body, GZIP_LEVEL), 'gzip'
@@ -0,0 +1,320 @@
+import os
+import logging
+from datetime import datetime
+from functools import partial
+from geopy.distance import geodesic
+import aio_http
+from utils import (get_coordinates, get_city_from_coords, find_best_bus_stand, extract_city, find_nearby_transport,
+                   get_coordinates_async, get_city_from_coords_async, find_best_bus_stand_async,
+                   find_nearby_transport_async)
+from mtc import (build_route_steps, generate_route_details, is_night_departure, fare_template, fill_provider_fare,
+                 format_total_fare)
+from providers import (fan_out, fetch_tnstc, fetch_abhibus, fetch_redbus, fetch_irctc,
+                       fetch_tnstc_async, fetch_irctc_async)
+from IRCTC import load_station_codes, get_search_index
+
+# Station codes are parsed from the PDF once and kept in a persisted index
+STATION_PDF_PATH = "S:\Project\example\Station_code.pdf"
+STATION_DATA = None
+
+# Provider order used when a search is assembled from cached pieces
+PROVIDER_ORDER = ('TNSTC', 'AbhiBus', 'RedBus', 'IRCTC')
+
+def get_station_data():
+    global STATION_DATA
+    if STATION_DATA is None:
+        if os.path.exists(STATION_PDF_PATH):
+            logging.info(f"Loading station codes from: {STATION_PDF_PATH}")
+            STATION_DATA = load_station_codes(STATION_PDF_PATH)
+            get_search_index(STATION_DATA)  # warm the name index used by search_station
+            logging.info(f"Loaded {len(STATION_DATA)} station codes")
+        else:
+            logging.warning(f"Station code PDF not found at: {STATION_PDF_PATH}")
+            STATION_DATA = {}
+    return STATION_DATA
+
+def _pair(sync_fn, async_fn, first, second, *args, **kwargs):
+    """
+    Run the same lookup for the source and destination side. With aiohttp available both
+    go out together on the shared event loop (rate-limited hosts such as Nominatim are
+    still spaced out by aio_http.host_limit); otherwise one after the other.
+    """
+    if aio_http.available():
+        return tuple(aio_http.run(aio_http.gather(async_fn(first, *args, **kwargs),
+                                                  async_fn(second, *args, **kwargs))))
+    return sync_fn(first, *args, **kwargs), sync_fn(second, *args, **kwargs)
+
+def _input_city(user_input, label):
+    """City/town from the last comma part of the input, or None to reverse geocode"""
+    if ',' in user_input:
+        input_city = extract_city(user_input)
+        if input_city:
+            logging.info(f"Using extracted {label} city from input: '{input_city}'")
+            return input_city
+    return None
+
+def _log_reverse_city(rev, user_input, label):
+    city = rev if rev else ""
+    if ',' in user_input:
+        logging.info(f"Extracted {label} empty; using reverse-geocoded {label} city: '{city}'")
+    else:
+        logging.info(f"No comma in {label} input; using reverse-geocoded {label} city: '{city}'")
+    return city
+
+def _derive_city(args):
+    """City/town for a search endpoint: last comma part of the input, else reverse geocode"""
+    user_input, coords, label = args
+    city = _input_city(user_input, label)
+    if city:
+        return city
+    return _log_reverse_city(get_city_from_coords(coords), user_input, label)
+
+async def _derive_city_async(args):
+    user_input, coords, label = args
+    city = _input_city(user_input, label)
+    if city:
+        return city
+    return _log_reverse_city(await get_city_from_coords_async(coords), user_input, label)
+
+def _bus_stand(args):
+    city, city_coords, label = args
+    if city and city_coords:
+        return _log_bus_stand(find_best_bus_stand(city, city_coords), label)
+    logging.info(f"Skipping {label} bus stand search - missing city name or coordinates")
+    return None
+
+async def _bus_stand_async(args):
+    city, city_coords, label = args
+    if city and city_coords:
+        return _log_bus_stand(await find_best_bus_stand_async(city, city_coords), label)
+    logging.info(f"Skipping {label} bus stand search - missing city name or coordinates")
+    return None
+
+def _log_bus_stand(info, label):
+    if info:
+        logging.info(f"Found {label} bus stand: {info['name']} at {info['coords']}")
+    else:
+        logging.info(f"No suitable {label} bus stand found")
+    return info
+
+def resolve_search(source_input, dest_input, date_input, mode):
+    """
+    Geocode the endpoints and work out cities, bus stands, stations and hub distance.
+    Returns (ctx, error); ctx always carries whatever was resolved for the results page.
+    """
+    ctx = {
+        'source_input': source_input, 'dest_input': dest_input, 'date_input': date_input, 'mode': mode,
+        'source_city': None, 'source_city_coords': None, 'source_bus_stand_coords': None, 'source_bus_stand_name': None,
+        'destination_city': None, 'dest_city_coords': None, 'dest_bus_stand_coords': None, 'dest_bus_stand_name': None,
+        'route_plans': {},   # (mode, hub pair, night) -> shared route steps, see route_plan
+    }
+    if not source_input or not dest_input or not date_input:
+        return ctx, "Missing input"
+
+    # Geocode source and destination
+    source_coords, dest_coords = _pair(get_coordinates, get_coordinates_async, source_input, dest_input)
+    if not source_coords or not dest_coords:
+        return ctx, "Could not geocode source or destination"
+    logging.info(f"Coordinates: Source={source_coords}, Destination={dest_coords}")
+    ctx['source_coords'] = source_coords
+    ctx['dest_coords'] = dest_coords
+
+    source_city, destination_city = _pair(_derive_city, _derive_city_async,
+                                          (source_input, source_coords, 'source'),
+                                          (dest_input, dest_coords, 'destination'))
+    logging.info(f"Derived source city/town: '{source_city.lower().strip()}', destination city/town: '{destination_city.lower().strip()}'")
+    ctx['source_city'] = source_city
+    ctx['destination_city'] = destination_city
+
+    # Geocode the extracted city/town names to get city-center coordinates
+    # (get_coordinates returns None for an empty name)
+    ctx['source_city_coords'], ctx['dest_city_coords'] = _pair(get_coordinates, get_coordinates_async,
+                                                               source_city, destination_city)
+    logging.info(f"Source city-center coords: {ctx['source_city_coords']}")
+    logging.info(f"Destination city-center coords: {ctx['dest_city_coords']}")
+
+    # Find best bus stands
+    source_bus_stand_info, dest_bus_stand_info = _pair(
+        _bus_stand, _bus_stand_async,
+        (source_city, ctx['source_city_coords'], 'source'),
+        (destination_city, ctx['dest_city_coords'], 'destination'))
+    ctx['source_bus_stand_info'] = source_bus_stand_info
+    ctx['dest_bus_stand_info'] = dest_bus_stand_info
+    if source_bus_stand_info:
+        ctx['source_bus_stand_coords'] = source_bus_stand_info['coords']
+        ctx['source_bus_stand_name'] = source_bus_stand_info['name']
+    if dest_bus_stand_info:
+        ctx['dest_bus_stand_coords'] = dest_bus_stand_info['coords']
+        ctx['dest_bus_stand_name'] = dest_bus_stand_info['name']
+
+    # Prepare date formats
+    try:
+        date_obj = datetime.strptime(date_input, "%Y-%m-%d")
+    except ValueError:
+        return ctx, "Invalid date format"
+    ctx['date_bus_abhibus'] = date_obj.strftime("%d-%m-%Y")  # e.g. 27-06-2025
+    ctx['date_redbus'] = date_obj.strftime("%d-%b-%Y")       # e.g. 27-Jun-2025
+    ctx['date_tnstc'] = date_obj.strftime("%d/%m/%Y")        # e.g. 27/06/2025
+    ctx['date_irctc'] = date_obj.strftime("%Y%m%d")
+
+    # Determine nearby source & dest train stations with larger radius
+    src_train_pts, dest_train_pts = _pair(find_nearby_transport, find_nearby_transport_async,
+                                          source_coords, dest_coords, 'train', radius=20000)  # 20km radius
+    src_station = src_train_pts[0] if src_train_pts else None
+    dest_station = dest_train_pts[0] if dest_train_pts else None
+
+    # Special handling for Chennai stations
+    if src_station and 'CHENNAI' in src_station['name'].upper():
+        src_station['name'] = "CHENNAI EGMORE"  # Default to Egmore
+        logging.info(f"Changed source station to Chennai Egmore")
+    if dest_station and 'CHENNAI' in dest_station['name'].upper():
+        dest_station['name'] = "CHENNAI EGMORE"
+        logging.info(f"Changed destination station to Chennai Egmore")
+    ctx['src_station'] = src_station
+    ctx['dest_station'] = dest_station
+
+    # Calculate hub-to-hub distance (either bus stands or train stations)
+    ctx['hub_to_hub_distance'] = None
+    ctx['hub_to_hub_name'] = ""
+    if ctx['source_bus_stand_coords'] and ctx['dest_bus_stand_coords']:
+        ctx['hub_to_hub_distance'] = geodesic(ctx['source_bus_stand_coords'], ctx['dest_bus_stand_coords']).km
+        ctx['hub_to_hub_name'] = f"{ctx['source_bus_stand_name']} to {ctx['dest_bus_stand_name']}"
+        logging.info(f"Bus hub-to-hub distance: {ctx['hub_to_hub_distance']:.1f} km")
+    elif src_station and dest_station:
+        ctx['hub_to_hub_distance'] = geodesic(src_station['coords'], dest_station['coords']).km
+        ctx['hub_to_hub_name'] = f"{src_station['name']} to {dest_station['name']}"
+        logging.info(f"Train station-to-station distance: {ctx['hub_to_hub_distance']:.1f} km")
+    return ctx, None
+
+def provider_tasks(ctx, only=None):
+    """Provider name -> callable for the providers this search's mode needs"""
+    c = ctx
+    tasks = {}
+    # HTTP-only providers go on the shared event loop when aiohttp is installed
+    use_async = aio_http.available()
+    if c['mode'] in ('bus', 'both'):
+        tasks['TNSTC'] = partial(fetch_tnstc_async if use_async else fetch_tnstc,
+                                 c['source_city'], c['destination_city'], c['source_bus_stand_info'],
+                                 c['dest_bus_stand_info'], c['date_tnstc'])
+        tasks['AbhiBus'] = lambda: fetch_abhibus(c['source_city'], c['destination_city'], c['source_bus_stand_info'],
+                                                 c['dest_bus_stand_info'], c['date_bus_abhibus'])
+        tasks['RedBus'] = lambda: fetch_redbus(c['source_city'], c['destination_city'], c['date_redbus'])
+    if c['mode'] in ('train', 'both'):
+        station_data = get_station_data()
+        if c['src_station'] and c['dest_station'] and station_data:
+            tasks['IRCTC'] = partial(fetch_irctc_async if use_async else fetch_irctc,
+                                     station_data, c['src_station'], c['dest_station'], c['date_irctc'])
+        else:
+            logging.info("Train search: missing nearby source or destination station")
+    if only is not None:
+        tasks = {name: fn for name, fn in tasks.items() if name in only}
+    return tasks
+
+def route_plan(ctx, hubs, is_bus, departure_time):
+    """
+    First/last mile route steps for this search's hub pair. The departure time only decides
+    night fares, so a plan is built once per (hub pair, night/day) and shared by every row.
+    hubs is (source hub coords, name, hub-to-hub km, hub-to-hub name, dest hub coords, name).
+    """
+    c = ctx
+    is_night = is_night_departure(departure_time)
+    key = ('bus' if is_bus else 'train', hubs[1], hubs[5], is_night)
+    plans = c.setdefault('route_plans', {})
+    plan = plans.get(key)
+    if plan is None:
+        steps = build_route_steps(c['source_input'], c['dest_input'], c['source_coords'], *hubs,
+                                  c['dest_coords'], is_bus=is_bus, departure_time=departure_time)
+        plan = plans[key] = {'steps': steps, 'fare_template': fare_template(steps), 'details': {}}
+    return plan
+
+def priced_route(plan, provider_fare):
+    """((total min, total max), route steps, route details HTML) for one row's provider fare"""
+    total_min, total_max, route_steps = fill_provider_fare(plan['steps'], plan['fare_template'], provider_fare)
+    details = plan['details'].get(provider_fare)
+    if details is None:
+        details = plan['details'][provider_fare] = generate_route_details(route_steps)
+    return (total_min, total_max), route_steps, details
+
+def bus_entry(ctx, r):
+    """Result row for a bus provider schedule, with first/last mile route steps"""
+    c = ctx
+    hubs = (
+        c['source_bus_stand_coords'] if c['source_bus_stand_coords'] else c['source_city_coords'],
+        c['source_bus_stand_name'] or c['source_city'],
+        c['hub_to_hub_distance'] or 0,
+        c['hub_to_hub_name'] or "Bus Journey",
+        c['dest_bus_stand_coords'] if c['dest_bus_stand_coords'] else c['dest_city_coords'],
+        c['dest_bus_stand_name'] or c['destination_city'],
+    )
+    plan = route_plan(c, hubs, True, r.get('departure'))
+    total_range, route_steps, route_details = priced_route(plan, r.get('fare'))
+
+    return {
+        'provider': r['provider'],
+        'operator': r['operator'],
+        'departure': r.get('departure',''),
+        'arrival': r.get('arrival',''),
+        'duration': r.get('duration',''),
+        'fare': r.get('fare',''),
+        'total_cost': format_total_fare(*total_range),
+        'total_cost_range': total_range,
+        'route_details': route_details,
+        'route_steps': route_steps,
+        'booking_link': r.get('booking_url')
+    }
+
+def train_entry(ctx, train):
+    """Result row for an IRCTC train, with first/last mile route steps"""
+    c = ctx
+    src_station, dest_station = c['src_station'], c['dest_station']
+    # Format available classes
+    classes_str = ', '.join(train['available_classes']) if train['available_classes'] else 'N/A'
+
+    hubs = (
+        src_station['coords'],
+        src_station['name'],
+        c['hub_to_hub_distance'] or 0,
+        f"{src_station['name']} to {dest_station['name']}",
+        dest_station['coords'],
+        dest_station['name'],
+    )
+    plan = route_plan(c, hubs, False, train['departure_time'])
+    total_range, route_steps, route_details = priced_route(plan, f"₹{train.get('fare', 'N/A')}")
+
+    return {
+        'provider': 'IRCTC',
+        'operator': f"{train['train_number']} {train['train_name']} ({train['train_type']})",
+        'departure': train['departure_time'],
+        'arrival': train['arrival_time'],
+        'duration': train['duration'],
+        'fare': f"Classes: {classes_str}",
+        'classes': train['available_classes'] or [],
+        'total_cost': format_total_fare(*total_range),
+        'total_cost_range': total_range,
+        'route_details': route_details,
+        'route_steps': route_steps,
+        'booking_link': 'https://www.irctc.co.in/nget/train-search'
+    }
+
+def build_entries(ctx, provider, rows):
+    """Turn one provider's raw rows into de-duplicated result entries"""
+    entries = []
+    seen = set()
+    for r in rows:
+        if provider == 'IRCTC':
+            key = ('IRCTC', r['train_number'], r['departure_time'], r['arrival_time'])
+        else:
+            key = (r['provider'], r['operator'], r.get('departure',''), r.get('arrival',''))
+        if key in seen:
+            continue
+        seen.add(key)
+        entries.append(train_entry(ctx, r) if provider == 'IRCTC' else bus_entry(ctx, r))
+    return entries
+
+def iter_search(ctx, only=None):
+    """
+    Fan out to the providers and yield (provider, entries) as each one completes;
+    entries is None when the provider failed or timed out (see providers.fan_out)
+    """
+    for provider, rows in fan_out(provider_tasks(ctx, only)):
+        yield provider, None if rows is None else build_entries(ctx, provider, rows)
@@ -0,0 +1,214 @@
+import os
+import re
+import sys
+import json
+import math
+import time
+import marshal
+import logging
+import threading
+
+try:
+    import osmium  # pyosmium, only needed to import .osm.pbf extracts
+except ImportError:
+    osmium = None
+
+# Local replacement for the Overpass "around" queries: bus stops, bus stations and
+# railway stations from an OSM extract (Tamil Nadu), bucketed into a lat/lon grid per kind.
+# Build it offline with `python spatial_index.py tamil-nadu.osm.pbf` (or an Overpass
+# JSON export); at runtime the index is loaded once and queried in-process.
+INDEX_VERSION = 1
+INDEX_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "osm_stops.idx")
+CELL_DEG = 0.01              # ~1.1 km grid cells
+EARTH_RADIUS_M = 6371000
+KNN_MAX_RADIUS_M = 50000     # nearest() gives up beyond this
+
+# OSM tag -> kind; a node can have several kinds (a bus_stop that is also a platform)
+KIND_TAGS = (
+    ('highway', 'bus_stop', 'bus_stop'),
+    ('amenity', 'bus_station', 'bus_station'),
+    ('public_transport', 'platform', 'platform'),
+    ('railway', 'station', 'station'),
+    ('railway', 'halt', 'halt'),
+)
+# Kind groups matching the Overpass queries they replace
+BUS_KINDS = ('bus_stop', 'bus_station')
+MTC_STOP_KINDS = ('bus_stop', 'platform')
+TRAIN_KINDS = ('station', 'halt')
+TRANSPORT_KINDS = {'bus': BUS_KINDS, 'train': TRAIN_KINDS}
+
+_index = None
+_load_attempted = False
+_lock = threading.Lock()
+
+def node_kinds(tags):
+    return tuple(kind for key, value, kind in KIND_TAGS if tags.get(key) == value)
+
+def _cell(lat, lon):
+    return (math.floor(lat / CELL_DEG), math.floor(lon / CELL_DEG))
+
+def make_grid(points):
+    """{cell: [ids]} for a list of (lat, lon), in the layout _scan() reads"""
+    grid = {}
+    for n, (lat, lon) in enumerate(points):
+        grid.setdefault(_cell(lat, lon), []).append(n)
+    return grid
+
+def _haversine_m(lat1, lon1, lat2, lon2):
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    a = (math.sin((phi2 - phi1) / 2) ** 2 +
+         math.cos(phi1) * math.cos(phi2) * math.sin(math.radians(lon2 - lon1) / 2) ** 2)
+    return 2 * EARTH_RADIUS_M * math.asin(math.sqrt(a))
+
+def read_osm_json(path):
+    """Yield (name, lat, lon, kinds) from an Overpass JSON export ({"elements": [...]})"""
+    with open(path, encoding='utf-8') as f:
+        data = json.load(f)
+    for element in data.get('elements', []):
+        if element.get('type', 'node') != 'node' or 'lat' not in element:
+            continue
+        tags = element.get('tags', {})
+        kinds = node_kinds(tags)
+        if kinds:
+            yield tags.get('name', ''), element['lat'], element['lon'], kinds
+
+def read_osm_pbf(path):
+    """Yield (name, lat, lon, kinds) from a .osm.pbf extract; needs pyosmium"""
+    if osmium is None:
+        raise RuntimeError("Importing .pbf extracts needs pyosmium (pip install osmium)")
+    found = []
+
+    class StopHandler(osmium.SimpleHandler):
+        def node(self, n):
+            tags = {k: v for k, v in n.tags}
+            kinds = node_kinds(tags)
+            if kinds and n.location.valid():
+                found.append((tags.get('name', ''), n.location.lat, n.location.lon, kinds))
+
+    StopHandler().apply_file(path)
+    return found
+
+def build_index(source_path, index_path=INDEX_PATH):
+    """Import an OSM extract and persist the grid index; returns the index"""
+    reader = read_osm_pbf if source_path.endswith('.pbf') else read_osm_json
+    names, lats, lons, kinds = [], [], [], []
+    cells = {kind: {} for _, _, kind in KIND_TAGS}   # kind -> {(i, j): [node ids]}
+    for name, lat, lon, node_kind in reader(source_path):
+        for kind in node_kind:
+            cells[kind].setdefault(_cell(lat, lon), []).append(len(names))
+        names.append(name)
+        lats.append(lat)
+        lons.append(lon)
+        kinds.append(node_kind)
+    index = {
+        'version': INDEX_VERSION,
+        'source': os.path.basename(source_path),
+        'built_at': time.time(),
+        'cell_deg': CELL_DEG,
+        'names': names, 'lats': lats, 'lons': lons, 'kinds': kinds,
+        'cells': cells,
+    }
+    with open(index_path, 'wb') as f:
+        marshal.dump(index, f)
+    logging.info(f"Indexed {len(names)} stops/stations from {source_path}")
+    return index
+
+def load_index(index_path=INDEX_PATH):
+    """Load a persisted index, or None if it is missing, stale-format or unreadable"""
+    if not os.path.exists(index_path):
+        return None
+    try:
+        with open(index_path, 'rb') as f:
+            index = marshal.load(f)
+    except Exception as e:
+        logging.warning(f"Could not read spatial index {index_path}: {e}")
+        return None
+    if index.get('version') != INDEX_VERSION or index.get('cell_deg') != CELL_DEG:
+        logging.warning(f"Spatial index {index_path} has an old format, rebuild it")
+        return None
+    logging.info(f"Loaded spatial index with {len(index['names'])} stops/stations")
+    return index
+
+def get_index():
+    """The loaded index, or None if no index was built (callers fall back to Overpass)"""
+    global _index, _load_attempted
+    if not _load_attempted:
+        with _lock:
+            if not _load_attempted:
+                _index = load_index()
+                _load_attempted = True
+    return _index
+
+def _scan(index, lat, lon, radius_m, kinds):
+    """(distance_m, id) for every node of the given kinds within the circle, nearest first"""
+    dlat = radius_m / 111320.0
+    dlon = radius_m / (111320.0 * max(math.cos(math.radians(lat)), 0.01))
+    i0, j0 = _cell(lat - dlat, lon - dlon)
+    i1, j1 = _cell(lat + dlat, lon + dlon)
+    lats, lons = index['lats'], index['lons']
+    seen = set()
+    hits = []
+    for kind in kinds or index['cells']:
+        grid = index['cells'].get(kind, {})
+        for i in range(i0, i1 + 1):
+            for j in range(j0, j1 + 1):
+                for n in grid.get((i, j), ()):
+                    if n in seen:
+                        continue
+                    seen.add(n)
+                    d = _haversine_m(lat, lon, lats[n], lons[n])
+                    if d <= radius_m:
+                        hits.append((d, n))
+    hits.sort()
+    return hits
+
+def _feature(index, n, distance):
+    return {
+        'name': index['names'][n],
+        'coords': (index['lats'][n], index['lons'][n]),
+        'kinds': index['kinds'][n],
+        'distance': distance,
+    }
+
+def nearby(lat, lon, radius_m, kinds=None, index=None):
+    """Nodes within radius_m (of the given kinds), nearest first, with 'distance' in meters"""
+    index = index or get_index()
+    if index is None:
+        return []
+    return [_feature(index, n, d) for d, n in _scan(index, lat, lon, radius_m, kinds)]
+
+def nearest(lat, lon, k=1, kinds=None, max_radius_m=KNN_MAX_RADIUS_M, index=None):
+    """k nearest nodes (of the given kinds), growing the search circle until k are found"""
+    index = index or get_index()
+    if index is None:
+        return []
+    radius = CELL_DEG * 111320.0
+    while True:
+        hits = _scan(index, lat, lon, min(radius, max_radius_m), kinds)
+        if len(hits) >= k or radius >= max_radius_m:
+            return [_feature(index, n, d) for d, n in hits[:k]]
+        radius *= 2
+
+def find_by_name(pattern, kinds=None, index=None):
+    """Coords of the first node whose name matches the regex (case-insensitive), like Overpass ~"...",i"""
+    index = index or get_index()
+    if index is None:
+        return None
+    try:
+        rx = re.compile(pattern, re.IGNORECASE)
+    except re.error:
+        rx = re.compile(re.escape(pattern), re.IGNORECASE)
+    wanted = set(kinds) if kinds else None
+    for n, name in enumerate(index['names']):
+        if name and rx.search(name) and (not wanted or not wanted.isdisjoint(index['kinds'][n])):
+            return (index['lats'][n], index['lons'][n])
+    return None
+
+
+if __name__ == "__main__":
+    # Offline build step: python spatial_index.py tamil-nadu.osm.pbf|overpass_export.json [index_path]
+    logging.basicConfig(level=logging.INFO)
+    if len(sys.argv) < 2:
+        print("Usage: python spatial_index.py <extract.osm.pbf|export.json> [index_path]")
+        sys.exit(1)
+    build_index(sys.argv[1], sys.argv[2] if len(sys.argv) > 2 else INDEX_PATH)
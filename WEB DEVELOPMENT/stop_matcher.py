@@ -0,0 +1,98 @@
+import re
+import threading
+from collections import Counter
+
+try:
+    from rapidfuzz import fuzz
+except ImportError:  # same scorers, pure-Python speed
+    from fuzzywuzzy import fuzz
+
+# OSM stop name -> MTC stop name matching. Instead of scoring a name against every
+# MTC stop, candidates are blocked through a token and trigram inverted index and
+# only those are scored; resolved names are memoised across requests.
+DEFAULT_THRESHOLD = 80
+MIN_TRIGRAM_OVERLAP = 0.5   # share of the query's trigrams a typo-only candidate needs
+MAX_MEMO = 50000
+
+def _normalize(name):
+    """Same normalisation as mtc.normalize_stop_name"""
+    return re.sub(r'[^\w\s]', '', name).upper().strip()
+
+def _trigrams(text):
+    text = f" {text} "
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+class StopMatcher:
+    """Inverted index over one stop collection; match() is what match_stop_name used to do"""
+
+    def __init__(self, stops):
+        self.stops = sorted(stops)   # sorted so ties resolve the same way every run
+        self.token_postings = {}
+        self.trigram_postings = {}
+        for i, stop in enumerate(self.stops):
+            for token in set(stop.split()):
+                self.token_postings.setdefault(token, []).append(i)
+            for gram in _trigrams(stop):
+                self.trigram_postings.setdefault(gram, []).append(i)
+        self.memo = {}
+        self.stats = {'memo_hits': 0, 'lookups': 0, 'candidates': 0}
+        self._lock = threading.Lock()
+
+    def candidates(self, query):
+        """Stops sharing a token with the query, plus near-spellings sharing most trigrams"""
+        ids = set()
+        for token in query.split():
+            ids.update(self.token_postings.get(token, ()))
+        grams = _trigrams(query)
+        counts = Counter()
+        for gram in grams:
+            counts.update(self.trigram_postings.get(gram, ()))
+        needed = max(1, int(len(grams) * MIN_TRIGRAM_OVERLAP))
+        ids.update(i for i, c in counts.items() if c >= needed)
+        return [self.stops[i] for i in sorted(ids)]
+
+    def match(self, osm_name, threshold=DEFAULT_THRESHOLD):
+        """Best MTC stop for an OSM name scoring at least threshold (token_set_ratio), else None"""
+        return self.match_with_score(osm_name, threshold)[0]
+
+    def match_with_score(self, osm_name, threshold=DEFAULT_THRESHOLD):
+        """(stop, token_set_ratio score) for the best match, or (None, 0)"""
+        query = _normalize(osm_name)
+        key = (query, threshold)
+        if key in self.memo:
+            self.stats['memo_hits'] += 1
+            return self.memo[key]
+        self.stats['lookups'] += 1
+
+        choices = self.candidates(query)
+        self.stats['candidates'] += len(choices)
+        # token_set_ratio scores every stop whose tokens are a subset of the query 100, so
+        # break ties on plain ratio: "DEPOT TEYNAMPET" beats "DEPOT" for "Depot Teynampet"
+        best_rank, result = None, (None, 0)
+        for stop in choices:
+            score = fuzz.token_set_ratio(query, stop)
+            if score >= threshold:
+                rank = (score, fuzz.ratio(query, stop))
+                if best_rank is None or rank > best_rank:
+                    best_rank, result = rank, (stop, score)
+
+        with self._lock:
+            if len(self.memo) >= MAX_MEMO:
+                self.memo.clear()
+            self.memo[key] = result
+        return result
+
+_matcher = None
+_matcher_key = None
+_build_lock = threading.Lock()
+
+def get_matcher(stops):
+    """Matcher for this stop collection, rebuilt when the collection is replaced or grows"""
+    global _matcher, _matcher_key
+    key = (id(stops), len(stops))
+    if _matcher_key != key:
+        with _build_lock:
+            if _matcher_key != key:
+                _matcher = StopMatcher(stops)
+                _matcher_key = key
+    return _matcher
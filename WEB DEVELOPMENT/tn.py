@@ -1,29 +1,42 @@
-import requests
 import logging
 from bs4 import BeautifulSoup
+import aio_http
+import http_client
 
-def get_tnstc_place_id(session, place_name, place_type='from'):
+TNSTC_URL = 'https://www.tnstc.in/OTRSOnline/jqreq.do'
+
+def get_tnstc_place_id(session, place_name, place_type='from', cookies=None):
     """
     Use TNSTC's autocomplete endpoint to get place ID and code:
     - place_type: 'from' or 'to'.
+    - cookies: optional dict, updated with the cookies TNSTC sets (the shared session keeps none).
     """
-    url = 'https://www.tnstc.in/OTRSOnline/jqreq.do'
-    params = {'hiddenAction': 'LoadFromPlaceList' if place_type == 'from' else 'LoadTOPlaceList'}
-    data = {('matchStartPlace' if place_type=='from' else 'matchEndPlace'): place_name}
+    params, data = _place_request(place_name, place_type)
     try:
-        r = session.post(url, params=params, data=data, timeout=10)
+        r = session.post(TNSTC_URL, params=params, data=data, cookies=cookies)
         if r.status_code != 200:
             return None, None
-        for opt in r.text.strip().split('^'):
-            if not opt:
-                continue
-            parts = opt.split(':')
-            if len(parts) >= 3 and place_name.upper() in parts[2].upper():
-                return parts[0], parts[1]
+        if cookies is not None:
+            cookies.update(r.cookies.get_dict())
+        return _parse_place_list(r.text, place_name)
     except Exception as e:
         logging.error(f"TNSTC place_id error: {e}")
     return None, None
 
+def _place_request(place_name, place_type):
+    params = {'hiddenAction': 'LoadFromPlaceList' if place_type == 'from' else 'LoadTOPlaceList'}
+    data = {('matchStartPlace' if place_type=='from' else 'matchEndPlace'): place_name}
+    return params, data
+
+def _parse_place_list(text, place_name):
+    for opt in text.strip().split('^'):
+        if not opt:
+            continue
+        parts = opt.split(':')
+        if len(parts) >= 3 and place_name.upper() in parts[2].upper():
+            return parts[0], parts[1]
+    return None, None
+
 def parse_tnstc_schedules(html):
     """Parse TNSTC search result HTML for schedule items."""
     soup = BeautifulSoup(html, 'html.parser')
@@ -58,13 +71,24 @@ def get_tnstc_bus_schedules(source, destination, date_str_ddmmyyyy):
     Search TNSTC schedules:
     - date_str_ddmmyyyy: in format 'DD/MM/YYYY'
     """
-    session = requests.Session()
-    sid, scode = get_tnstc_place_id(session, source, 'from')
-    did, dcode = get_tnstc_place_id(session, destination, 'to')
+    session = http_client.get_session(TNSTC_URL)
+    cookies = {}
+    sid, scode = get_tnstc_place_id(session, source, 'from', cookies)
+    did, dcode = get_tnstc_place_id(session, destination, 'to', cookies)
     if not sid or not did:
         logging.info(f"TNSTC: could not find place IDs for '{source}' or '{destination}'")
         return []
-    url = 'https://www.tnstc.in/OTRSOnline/jqreq.do'
+    params, data = _search_request(source, destination, date_str_ddmmyyyy, sid, scode, did, dcode)
+    try:
+        r = session.post(TNSTC_URL, params=params, data=data, cookies=cookies)
+        if r.status_code != 200:
+            return []
+        return parse_tnstc_schedules(r.text)
+    except Exception as e:
+        logging.error(f"TNSTC schedules error: {e}")
+        return []
+
+def _search_request(source, destination, date_str_ddmmyyyy, sid, scode, did, dcode):
     params = {'hiddenAction':'SearchService'}
     data = {
         'hiddenStartPlaceID': sid,
@@ -83,11 +107,47 @@ def get_tnstc_bus_schedules(source, destination, date_str_ddmmyyyy):
         'languageType':'E',
         'checkSingleLady':'N'
     }
+    return params, data
+
+async def _post_async(params, data, cookies=None):
+    """
+    POST to the TNSTC endpoint on the shared session; returns the text or None.
+    cookies: optional dict sent with the request and updated with the cookies TNSTC sets.
+    """
+    session = await aio_http.get_session()
+    async with session.post(TNSTC_URL, params=params, data=data, cookies=cookies,
+                            timeout=aio_http.client_timeout(10)) as r:
+        if r.status != 200:
+            return None
+        if cookies is not None:
+            cookies.update({k: m.value for k, m in r.cookies.items()})
+        return await r.text()
+
+async def get_tnstc_place_id_async(place_name, place_type='from', cookies=None):
+    """Async get_tnstc_place_id, with the same cookies handling"""
     try:
-        r = session.post(url, params=params, data=data, timeout=10)
-        if r.status_code != 200:
-            return []
-        return parse_tnstc_schedules(r.text)
+        text = await _post_async(*_place_request(place_name, place_type), cookies)
+        if text is not None:
+            return _parse_place_list(text, place_name)
+    except Exception as e:
+        logging.error(f"TNSTC place_id error: {e}")
+    return None, None
+
+async def get_tnstc_bus_schedules_async(source, destination, date_str_ddmmyyyy):
+    """
+    Async get_tnstc_bus_schedules. As in the blocking version the two place lookups run one
+    after the other on one cookie jar, so the search goes out on the JSESSIONID they used.
+    """
+    cookies = {}
+    sid, scode = await get_tnstc_place_id_async(source, 'from', cookies)
+    did, dcode = await get_tnstc_place_id_async(destination, 'to', cookies)
+    if not sid or not did:
+        logging.info(f"TNSTC: could not find place IDs for '{source}' or '{destination}'")
+        return []
+    params, data = _search_request(source, destination, date_str_ddmmyyyy, sid, scode, did, dcode)
+    try:
+        text = await _post_async(params, data, cookies)
+        return parse_tnstc_schedules(text) if text is not None else []
     except Exception as e:
         logging.error(f"TNSTC schedules error: {e}")
-        return []
\ No newline at end of file
+        return []
@@ -1,15 +1,27 @@
 import re
 import math
 import logging
-import requests
+import http_client
 from geopy.geocoders import Photon, Nominatim
-from geopy.distance import geodesic
 from geopy.exc import GeocoderUnavailable, GeocoderTimedOut
+from geocache import cached_lookup, cached_lookup_async, TransientLookupError
+import aio_http
+import spatial_index
+
+try:
+    import numpy as np
+except ImportError:  # batch distances fall back to a plain loop
+    np = None
 
 # Initialize geocoders
 photon_geolocator = Photon(user_agent="transport_finder_v4", domain="photon.komoot.io")
 nomi_geolocator = Nominatim(user_agent="transport_finder_v4_nominatim")
 
+OSRM_ROUTE_URL = "http://router.project-osrm.org/route/v1/driving/"
+OVERPASS_URL = "https://overpass-api.de/api/interpreter"
+NOMINATIM_URL = "https://nominatim.openstreetmap.org"
+PHOTON_URL = "https://photon.komoot.io"
+
 def haversine_distance(lat1, lon1, lat2, lon2):
     """Calculate the great-circle distance between two points in meters"""
     R = 6371000  # Earth radius in meters
@@ -21,6 +33,49 @@ def haversine_distance(lat1, lon1, lat2, lon2):
     c = 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
     return R * c
 
+EARTH_RADIUS_M = 6371000
+
+def haversine_many(origin, points):
+    """
+    Great-circle distances in meters from one (lat, lon) origin to N (lat, lon) points.
+    Returns a NumPy array when NumPy is installed, else a list.
+    """
+    if not len(points):
+        return np.zeros(0) if np is not None else []
+    if np is None:
+        return [haversine_distance(origin[0], origin[1], p[0], p[1]) for p in points]
+    pts = np.radians(np.asarray(points, dtype=float))
+    lat1, lon1 = math.radians(origin[0]), math.radians(origin[1])
+    a = (np.sin((pts[:, 0] - lat1) / 2) ** 2 +
+         math.cos(lat1) * np.cos(pts[:, 0]) * np.sin((pts[:, 1] - lon1) / 2) ** 2)
+    return 2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+def haversine_matrix(origins, points):
+    """N x M great-circle distances in meters between two lists of (lat, lon)"""
+    if np is None:
+        return [list(haversine_many(o, points)) for o in origins]
+    if not len(origins) or not len(points):
+        return np.zeros((len(origins), len(points)))
+    o = np.radians(np.asarray(origins, dtype=float))[:, None, :]
+    p = np.radians(np.asarray(points, dtype=float))[None, :, :]
+    a = (np.sin((p[..., 0] - o[..., 0]) / 2) ** 2 +
+         np.cos(o[..., 0]) * np.cos(p[..., 0]) * np.sin((p[..., 1] - o[..., 1]) / 2) ** 2)
+    return 2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+def rank_by_distance(origin, points, limit=None):
+    """(indices nearest first, distances in meters) for points around origin"""
+    distances = haversine_many(origin, points)
+    if np is None:
+        order = sorted(range(len(distances)), key=distances.__getitem__)
+    elif limit is not None and limit < len(distances):
+        # Partial sort: only the first `limit` need ordering
+        part = np.argpartition(distances, limit)[:limit]
+        order = part[np.argsort(distances[part], kind='stable')]
+    else:
+        order = np.argsort(distances, kind='stable')
+    distances = distances.tolist() if np is not None else distances
+    return [int(i) for i in order[:limit]], distances
+
 def normalize_stop_name(name):
     """Normalize stop name by removing punctuation and converting to uppercase"""
     name = re.sub(r'[^\w\s]', '', name)
@@ -29,80 +84,105 @@ def normalize_stop_name(name):
 def get_road_distance(origin, destination):
     """Get road distance in meters using OSRM API"""
     # OSRM demo server (public, no API key needed)
-    url = "http://router.project-osrm.org/route/v1/driving/"
-    
-    # Format: lon,lat;lon,lat
-    coords = f"{origin[1]},{origin[0]};{destination[1]},{destination[0]}"
-    
     try:
-        response = requests.get(url + coords, timeout=10)
-        data = response.json()
-        
-        if data['code'] == 'Ok':
-            # Get distance in meters from first route
-            distance = data['routes'][0]['distance']
-            return distance
-        else:
-            logging.warning(f"OSRM API error: {data.get('message', 'Unknown error')}")
-            return None
+        response = http_client.get(OSRM_ROUTE_URL + _osrm_coords(origin, destination))
+        return _osrm_distance(response.json())
     except Exception as e:
         logging.error(f"Error getting road distance: {e}")
         return None
 
+def _osrm_coords(origin, destination):
+    # Format: lon,lat;lon,lat
+    return f"{origin[1]},{origin[0]};{destination[1]},{destination[0]}"
+
+def _osrm_distance(data):
+    if data['code'] == 'Ok':
+        # Get distance in meters from first route
+        return data['routes'][0]['distance']
+    logging.warning(f"OSRM API error: {data.get('message', 'Unknown error')}")
+    return None
+
 def get_coordinates(location, is_station=False):
     """
     Get latitude and longitude for a given location with retry logic, using Nominatim.
     If is_station is True, try variations with "Railway Station" and "Junction".
-    Returns (lat, lon) or None.
+    Results (including misses) are cached in geocache. Returns (lat, lon) or None.
     """
+    if not location:
+        return None
+    query = f"{'station' if is_station else 'place'}:{location.strip().lower()}"
+    return cached_lookup('forward', query, lambda: _geocode_location(location, is_station))
+
+def _geocode_queries(location, is_station=False):
+    """Queries to try in order: the input (plus station variants), simplified address, city part"""
+    queries = [location]
+    if is_station:
+        queries += [
+            f"{location} Railway Station",
+            f"{location} Junction",
+            f"{location} Station"
+        ]
+    # If no success with variations, try simplified address, then the city part
+    for fallback in (simplify_address(location), extract_city(location)):
+        if fallback and fallback not in queries:
+            queries.append(fallback)
+    return queries
+
+def _geocode_location(location, is_station=False):
+    """Uncached forward geocode; raises TransientLookupError if the geocoder is unreachable."""
     try:
         logging.info(f"Geocoding location: {location} (is_station={is_station})")
-        
-        # Create variations for station searches
-        variations = [location]
-        if is_station:
-            variations += [
-                f"{location} Railway Station",
-                f"{location} Junction",
-                f"{location} Station"
-            ]
-        
-        # Try each variation
-        for loc_query in variations:
+        for loc_query in _geocode_queries(location, is_station):
             location_info = nomi_geolocator.geocode(loc_query, exactly_one=True, timeout=10)
             if location_info:
                 lat, lon = location_info.latitude, location_info.longitude
                 logging.info(f"Found coordinates: {lat}, {lon} for '{loc_query}'")
                 return (lat, lon)
         
-        # If no success with variations, try simplified address
-        simplified = simplify_address(location)
-        if simplified and simplified != location:
-            logging.info(f"Retry geocoding with simplified address: {simplified}")
-            location_info = nomi_geolocator.geocode(simplified, exactly_one=True, timeout=10)
-            if location_info:
-                lat, lon = location_info.latitude, location_info.longitude
-                logging.info(f"Found coordinates (simplified): {lat}, {lon} for '{simplified}'")
-                return (lat, lon)
-        
-        # Try fallback city part
-        city_part = extract_city(location)
-        if city_part and city_part != location:
-            logging.info(f"Retry geocoding with city part: {city_part}")
-            location_info = nomi_geolocator.geocode(city_part, exactly_one=True, timeout=10)
-            if location_info:
-                lat, lon = location_info.latitude, location_info.longitude
-                logging.info(f"Found coordinates (city part): {lat}, {lon} for '{city_part}'")
-                return (lat, lon)
-        
         logging.warning(f"Could not geocode: '{location}'")
         return None
     except (GeocoderUnavailable, GeocoderTimedOut) as e:
         logging.warning(f"Geocoding unavailable/timed out for '{location}': {e}")
-        return None
+        raise TransientLookupError(str(e))
     except Exception as e:
         logging.error(f"Error getting coordinates for '{location}': {e}")
+        raise TransientLookupError(str(e))
+
+async def _get_json_async(url, params, timeout=10):
+    """
+    GET a JSON API on the shared session, within the host's rate limit (aio_http.HOST_LIMITS);
+    network trouble becomes TransientLookupError
+    """
+    try:
+        session = await aio_http.get_session()
+        async with aio_http.host_limit(url):
+            async with session.get(url, params=params, timeout=aio_http.client_timeout(timeout)) as response:
+                if response.status == 429 or response.status >= 500:
+                    raise TransientLookupError(f"{url} returned HTTP {response.status}")
+                return await response.json(content_type=None)
+    except TransientLookupError:
+        raise
+    except Exception as e:
+        raise TransientLookupError(f"{url}: {e!r}")
+
+async def get_coordinates_async(location, is_station=False):
+    """Async get_coordinates: same cache and query order, Nominatim over the shared session"""
+    if not location:
         return None
+    query = f"{'station' if is_station else 'place'}:{location.strip().lower()}"
+    return await cached_lookup_async('forward', query, lambda: _geocode_location_async(location, is_station))
+
+async def _geocode_location_async(location, is_station=False):
+    logging.info(f"Geocoding location: {location} (is_station={is_station})")
+    for loc_query in _geocode_queries(location, is_station):
+        data = await _get_json_async(f"{NOMINATIM_URL}/search",
+                                     {'q': loc_query, 'format': 'json', 'limit': 1})
+        if data:
+            lat, lon = float(data[0]['lat']), float(data[0]['lon'])
+            logging.info(f"Found coordinates: {lat}, {lon} for '{loc_query}'")
+            return (lat, lon)
+    logging.warning(f"Could not geocode: '{location}'")
+    return None
 
 def simplify_address(address):
     """Simplify address by removing initial numbers or 'near ...' parts."""
@@ -134,26 +214,32 @@ def get_city_from_coords(coords, timeout=10):
     """
     Reverse geocode coords to get a city/town/village name.
     First try Photon; if too generic, fallback to Nominatim.
-    Returns a string or None.
+    Results (including misses) are cached in geocache. Returns a string or None.
     """
-    lat, lon = coords
+    query = f"{round(coords[0], 5)},{round(coords[1], 5)}"
+    return cached_lookup('reverse', query, lambda: _reverse_geocode_city(coords, timeout))
 
-    def extract_from_address(addr: dict):
-        # priority: city, town, village, hamlet, municipality, county, suburb, locality, then state/region
-        for key in ('city', 'town', 'village', 'hamlet', 'municipality', 'county', 'suburb', 'locality'):
-            if key in addr and addr[key].strip():
-                return addr[key].strip()
-        for key in ('state', 'region', 'state_district'):
-            if key in addr and addr[key].strip():
-                return addr[key].strip()
-        return None
+def _city_from_address(addr: dict):
+    # priority: city, town, village, hamlet, municipality, county, suburb, locality, then state/region
+    for key in ('city', 'town', 'village', 'hamlet', 'municipality', 'county', 'suburb', 'locality'):
+        if key in addr and addr[key].strip():
+            return addr[key].strip()
+    for key in ('state', 'region', 'state_district'):
+        if key in addr and addr[key].strip():
+            return addr[key].strip()
+    return None
+
+def _reverse_geocode_city(coords, timeout=10):
+    """Uncached reverse geocode; raises TransientLookupError if both geocoders were unreachable."""
+    lat, lon = coords
+    failures = 0
 
     # Try Photon reverse
     try:
         loc = photon_geolocator.reverse((lat, lon), exactly_one=True, timeout=timeout)
         if loc and loc.raw:
             addr = loc.raw.get('address', {})
-            city = extract_from_address(addr)
+            city = _city_from_address(addr)
             if city and city.lower() not in ('india', 'country', ''):
                 logging.info(f"Photon reverse: using '{city}' for coords {coords}")
                 return city
@@ -162,8 +248,10 @@ def get_city_from_coords(coords, timeout=10):
         else:
             logging.info(f"Photon reverse returned no useful data for coords {coords}, falling back to Nominatim")
     except (GeocoderUnavailable, GeocoderTimedOut) as e:
+        failures += 1
         logging.warning(f"Photon reverse unavailable/timed out: {e}. Falling back to Nominatim.")
     except Exception as e:
+        failures += 1
         logging.warning(f"Photon reverse error: {e}. Falling back to Nominatim.")
 
     # Fallback: Nominatim reverse
@@ -171,7 +259,7 @@ def get_city_from_coords(coords, timeout=10):
         loc2 = nomi_geolocator.reverse((lat, lon), exactly_one=True, timeout=timeout)
         if loc2 and loc2.raw:
             addr2 = loc2.raw.get('address', {})
-            city2 = extract_from_address(addr2)
+            city2 = _city_from_address(addr2)
             if city2 and city2.lower() not in ('india', 'country', ''):
                 logging.info(f"Nominatim reverse: using '{city2}' for coords {coords}")
                 return city2
@@ -186,78 +274,159 @@ def get_city_from_coords(coords, timeout=10):
         else:
             logging.info(f"Nominatim reverse returned no useful data for coords {coords}")
     except (GeocoderUnavailable, GeocoderTimedOut) as e:
+        failures += 1
         logging.warning(f"Nominatim reverse unavailable/timed out: {e}.")
     except Exception as e:
+        failures += 1
         logging.warning(f"Nominatim reverse error: {e}.")
 
+    if failures == 2:
+        raise TransientLookupError(f"reverse geocoders unavailable for {coords}")
     return None
 
+async def get_city_from_coords_async(coords, timeout=10):
+    """Async get_city_from_coords: Photon, then Nominatim, over the shared session"""
+    query = f"{round(coords[0], 5)},{round(coords[1], 5)}"
+    return await cached_lookup_async('reverse', query, lambda: _reverse_geocode_city_async(coords, timeout))
+
+async def _reverse_geocode_city_async(coords, timeout=10):
+    lat, lon = coords
+    failures = 0
+
+    try:
+        data = await _get_json_async(f"{PHOTON_URL}/reverse", {'lat': lat, 'lon': lon, 'limit': 1}, timeout)
+        features = data.get('features') or []
+        city = _city_from_address(features[0].get('properties', {})) if features else None
+        if city and city.lower() not in ('india', 'country', ''):
+            logging.info(f"Photon reverse: using '{city}' for coords {coords}")
+            return city
+        logging.info(f"Photon reverse too generic ('{city}'), falling back to Nominatim for coords {coords}")
+    except TransientLookupError as e:
+        failures += 1
+        logging.warning(f"Photon reverse unavailable/timed out: {e}. Falling back to Nominatim.")
+
+    try:
+        data = await _get_json_async(f"{NOMINATIM_URL}/reverse",
+                                     {'lat': lat, 'lon': lon, 'format': 'json', 'addressdetails': 1}, timeout)
+        city2 = _city_from_address(data.get('address', {}))
+        if city2 and city2.lower() not in ('india', 'country', ''):
+            logging.info(f"Nominatim reverse: using '{city2}' for coords {coords}")
+            return city2
+        # Last resort: last part of display name
+        parts = [p.strip() for p in (data.get('display_name') or "").split(',') if p.strip()]
+        if parts:
+            logging.info(f"Nominatim reverse fallback to last component '{parts[-1]}' for coords {coords}")
+            return parts[-1]
+    except TransientLookupError as e:
+        failures += 1
+        logging.warning(f"Nominatim reverse unavailable/timed out: {e}.")
+
+    if failures == 2:
+        raise TransientLookupError(f"reverse geocoders unavailable for {coords}")
+    return None
+
+def _transport_query(coords, transport_type, radius):
+    lat, lon = coords
+    if transport_type == "bus":
+        return f"""
+        [out:json];
+        (
+          node["highway"="bus_stop"](around:{radius}, {lat}, {lon});
+          node["amenity"="bus_station"](around:{radius}, {lat}, {lon});
+        );
+        out body;
+        """
+    if transport_type == "train":
+        return f"""
+        [out:json];
+        (
+          node["railway"="station"](around:{radius}, {lat}, {lon});
+          node["railway"="halt"](around:{radius}, {lat}, {lon});
+        );
+        out body;
+        """
+    return None
+
+def _transport_points(coords, transport_type, data):
+    elements = data.get('elements', [])
+    points = [(element['lat'], element['lon']) for element in elements]
+    order, distances = rank_by_distance(coords, points)
+    return [{
+        'name': elements[i].get('tags', {}).get('name', 'Unnamed'),
+        'distance': round(distances[i]),
+        'coords': points[i],
+        'type': transport_type
+    } for i in order]
+
+def _local_transport_points(coords, transport_type, radius):
+    """Answer from the local OSM index when one has been built; None means ask Overpass"""
+    kinds = spatial_index.TRANSPORT_KINDS.get(transport_type)
+    if kinds is None or spatial_index.get_index() is None:
+        return None
+    return [{
+        'name': f['name'] or 'Unnamed',
+        'distance': round(f['distance']),
+        'coords': f['coords'],
+        'type': transport_type
+    } for f in spatial_index.nearby(coords[0], coords[1], radius, kinds)]
+
 def find_nearby_transport(coords, transport_type, radius=5000):
-    """Find nearby bus stops/stations or train stations using Overpass API."""
+    """Find nearby bus stops/stations or train stations (local OSM index, else Overpass API)."""
+    local = _local_transport_points(coords, transport_type, radius)
+    if local is not None:
+        return local
     try:
-        lat, lon = coords
-        if transport_type == "bus":
-            query = f"""
-            [out:json];
-            (
-              node["highway"="bus_stop"](around:{radius}, {lat}, {lon});
-              node["amenity"="bus_station"](around:{radius}, {lat}, {lon});
-            );
-            out body;
-            """
-        elif transport_type == "train":
-            query = f"""
-            [out:json];
-            (
-              node["railway"="station"](around:{radius}, {lat}, {lon});
-              node["railway"="halt"](around:{radius}, {lat}, {lon});
-            );
-            out body;
-            """
-        else:
+        query = _transport_query(coords, transport_type, radius)
+        if query is None:
             return []
-        response = requests.post("https://overpass-api.de/api/interpreter", data={'data': query}, timeout=15)
-        data = response.json()
-        transport_points = []
-        for element in data.get('elements', []):
-            name = element.get('tags', {}).get('name', 'Unnamed')
-            point_coords = (element['lat'], element['lon'])
-            distance = geodesic(coords, point_coords).meters
-            transport_points.append({
-                'name': name,
-                'distance': round(distance),
-                'coords': point_coords,
-                'type': transport_type
-            })
-        transport_points.sort(key=lambda x: x['distance'])
-        return transport_points
+        response = http_client.post(OVERPASS_URL, data={'data': query})
+        return _transport_points(coords, transport_type, response.json())
     except Exception as e:
         logging.error(f"Error finding nearby {transport_type}: {e}")
         return []
 
-def find_best_bus_stand(city_name, reference_coords):
-    """
-    Find the best bus stand for a city with multiple variations and validation.
-    Returns dictionary with 'coords', 'name', and 'distance' (in km) or None.
-    """
+async def find_nearby_transport_async(coords, transport_type, radius=5000):
+    """Async find_nearby_transport; only goes to Overpass when there is no local index"""
+    local = _local_transport_points(coords, transport_type, radius)
+    if local is not None:
+        return local
+    try:
+        query = _transport_query(coords, transport_type, radius)
+        if query is None:
+            return []
+        session = await aio_http.get_session()
+        async with session.post(OVERPASS_URL, data={'data': query},
+                                timeout=aio_http.client_timeout(15)) as response:
+            return _transport_points(coords, transport_type, await response.json(content_type=None))
+    except Exception as e:
+        logging.error(f"Error finding nearby {transport_type}: {e}")
+        return []
+
+def _bus_stand_variations(city_name):
     # List of possible bus stand name variations
-    variations = [
+    return [
         f"{city_name} Bus Stand",
         f"{city_name} Bus Terminal",
         f"{city_name} Bus Station",
         f"Bus Stand, {city_name}",
         f"{city_name} Main Bus Stand"
     ]
-    
+
+BUS_STAND_MAX_KM = 20
+BUS_STAND_GOOD_ENOUGH_KM = 5
+
+def _stand_distance_km(coords, reference_coords):
+    return haversine_distance(coords[0], coords[1], reference_coords[0], reference_coords[1]) / 1000
+
+def _pick_bus_stand(candidates, reference_coords):
+    """Nearest (name, coords) within 20 km; the first one within 5 km is good enough"""
     best_stand = None
     min_distance = float('inf')  # initialize with a large number
-    
-    for name in variations:
-        coords = get_coordinates(name)
+    for name, coords in candidates:
         if coords:
             # Calculate distance to reference coordinates
-            distance = geodesic(coords, reference_coords).km
-            if distance < min_distance and distance <= 20:  # within 20 km
+            distance = _stand_distance_km(coords, reference_coords)
+            if distance < min_distance and distance <= BUS_STAND_MAX_KM:
                 min_distance = distance
                 best_stand = {
                     'coords': coords,
@@ -265,11 +434,32 @@ def find_best_bus_stand(city_name, reference_coords):
                     'distance': distance
                 }
                 # If we found one within 5 km, break early (good enough)
-                if distance <= 5:
+                if distance <= BUS_STAND_GOOD_ENOUGH_KM:
                     break
-    
     return best_stand
 
+def find_best_bus_stand(city_name, reference_coords):
+    """
+    Find the best bus stand for a city with multiple variations and validation.
+    Returns dictionary with 'coords', 'name', and 'distance' (in km) or None.
+    """
+    # Lazy, so geocoding stops at the first stand within 5 km
+    candidates = ((name, get_coordinates(name)) for name in _bus_stand_variations(city_name))
+    return _pick_bus_stand(candidates, reference_coords)
+
+async def find_best_bus_stand_async(city_name, reference_coords):
+    """
+    Async find_best_bus_stand: variations are geocoded one after another and it stops at
+    the first stand within 5 km, like the sync version (Nominatim allows ~1 request/s)
+    """
+    candidates = []
+    for name in _bus_stand_variations(city_name):
+        coords = await get_coordinates_async(name)
+        candidates.append((name, coords))
+        if coords and _stand_distance_km(coords, reference_coords) <= BUS_STAND_GOOD_ENOUGH_KM:
+            break
+    return _pick_bus_stand(candidates, reference_coords)
+
 
 
 def get_auto_fare(distance_km, is_night=False):